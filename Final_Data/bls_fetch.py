@@ -0,0 +1,167 @@
+'''
+Concurrent client for the BLS Public Data API (v2), used by Final_Data_Pull.ipynb.
+
+Requests are planned automatically within the API limits (50 series and 20 years
+per request), sent over one pooled session by a bounded thread pool, retried with
+exponential backoff, and optionally checkpointed so an interrupted pull only
+re-requests the batches it had not finished.
+'''
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+API_URL = 'https://api.bls.gov/publicAPI/v2/timeseries/data/'
+MAX_SERIES = 50 # Series per request with a registration key.
+MAX_YEARS = 20 # Years per request with a registration key.
+
+class BLSError(Exception):
+    pass
+
+def plan_batches(series_ids, start_year, end_year, max_series=MAX_SERIES, max_years=MAX_YEARS):
+    '''
+    Splits a pull into (series_ids, start_year, end_year) requests that fit the API
+    limits, using as few requests as possible and keeping batches evenly sized.
+    Ordered by year range, then series, like the hand-built groups it replaces.
+    '''
+    series_ids = list(dict.fromkeys(series_ids)) # Drop repeats, keep order.
+    n_groups = max(1, -(-len(series_ids) // max_series))
+    size = -(-len(series_ids) // n_groups) if series_ids else 0
+    groups = [series_ids[i:i + size] for i in range(0, len(series_ids), size)] if size else []
+
+    batches = []
+    for year in range(int(start_year), int(end_year) + 1, max_years):
+        for group in groups:
+            batches.append((tuple(group), year, min(year + max_years - 1, int(end_year))))
+
+    return batches
+
+def parse_results(j):
+    '''
+    Turns one API response into a DataFrame with one row per observation and a
+    'series' column, matching the notebook's original API_call.
+    '''
+    dfs = []
+    for s in j['Results']['series']:
+        t_df = pd.DataFrame(s['data'])
+        t_df['series'] = s['seriesID']
+        dfs.append(t_df)
+    if not dfs:
+        return pd.DataFrame(columns=['year', 'period', 'periodName', 'value', 'footnotes', 'series'])
+    return pd.concat(dfs)
+
+class BLSFetcher(object):
+    '''
+    Fetches BLS series concurrently.
+
+        fetcher = BLSFetcher(api_key='...', checkpoint_dir='bls_checkpoints')
+        df = fetcher.fetch(series_ids, 1970, 2022)
+
+    workers bounds the number of requests in flight. Failed requests (connection
+    errors, HTTP 429/5xx, or an API status other than REQUEST_SUCCEEDED) are retried
+    up to retries times, waiting backoff * 2**attempt seconds (plus jitter) between
+    tries, or as long as a Retry-After header asks. max_per_second spaces out
+    request starts across all workers to stay under the API's rate limit.
+    '''
+
+    def __init__(self, api_key=None, url=API_URL, workers=4, retries=5, backoff=0.5,
+                 max_per_second=4, timeout=60, checkpoint_dir=None):
+        self.api_key = api_key if api_key is not None else os.environ.get('BLS_API_KEY')
+        self.url = url
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.checkpoint_dir = checkpoint_dir
+        self.interval = 1.0 / max_per_second if max_per_second else 0
+        self.next_start = 0
+        self.lock = threading.Lock()
+        self.requests_sent = 0
+
+        # One keep-alive connection pool shared by all workers; retries happen in post().
+        self.session = requests.Session()
+        self.session.headers['Content-type'] = 'application/json'
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def checkpoint_path(self, batch):
+        name = hashlib.sha1(json.dumps([list(batch[0]), batch[1], batch[2]]).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.checkpoint_dir, name + '.json')
+
+    def throttle(self):
+
+        # Reserve the next start slot under the lock, then sleep outside it.
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+            self.requests_sent += 1
+        if start > now:
+            time.sleep(start - now)
+
+    def post(self, batch):
+        series_ids, start_year, end_year = batch
+        payload = {'seriesid': list(series_ids), 'startyear': str(start_year), 'endyear': str(end_year)}
+        if self.api_key:
+            payload['registrationkey'] = self.api_key
+
+        for attempt in range(self.retries + 1):
+            self.throttle()
+            wait = self.backoff * 2 ** attempt * (1 + random.random())
+            try:
+                r = self.session.post(self.url, data=json.dumps(payload), timeout=self.timeout)
+                if r.status_code == 429 or r.status_code >= 500:
+                    wait = max(wait, float(r.headers.get('Retry-After', 0) or 0))
+                    error = BLSError('HTTP %d for %s' % (r.status_code, batch))
+                else:
+                    r.raise_for_status()
+                    j = r.json()
+                    if j.get('status') == 'REQUEST_SUCCEEDED':
+                        return j
+                    error = BLSError('%s for %s: %s' % (j.get('status'), batch, '; '.join(j.get('message', []))))
+            except (requests.ConnectionError, requests.Timeout, ValueError) as e:
+                error = BLSError('%s for %s' % (e, batch))
+            if attempt < self.retries:
+                time.sleep(wait)
+
+        raise error
+
+    def fetch_batch(self, batch):
+        '''
+        Returns the API response for one planned batch, from its checkpoint if one exists.
+        '''
+        if self.checkpoint_dir is None:
+            return self.post(batch)
+
+        path = self.checkpoint_path(batch)
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+
+        j = self.post(batch)
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(j, f)
+        os.replace(tmp, path) # A checkpoint is either complete or absent.
+
+        return j
+
+    def fetch(self, series_ids, start_year, end_year):
+        '''
+        Fetches every series over start_year..end_year and returns one DataFrame,
+        in the same row order as running the planned batches one after another.
+        '''
+        batches = plan_batches(series_ids, start_year, end_year)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(self.fetch_batch, batches))
+
+        return pd.concat([parse_results(j) for j in results])
@@ -0,0 +1,189 @@
+'''
+Local stand-in for the BLS Public Data API (v2) for exercising bls_fetch.py without
+a registration key or network access.
+
+    python bls_stub.py [--port 8765] [--latency 0.2] [--fail-rate 0.1]
+    python bls_stub.py --check
+
+Responses follow the v2 JSON layout (status, message, Results.series[].data[],
+newest observation first) with made-up values. Requests over 50 series or 20 years
+get REQUEST_NOT_PROCESSED like the real API, and --fail-rate answers that share of
+requests with HTTP 503 to exercise retries. --check starts a stub in-process and
+runs a full pull through BLSFetcher against it.
+'''
+import argparse
+import functools
+import json
+import random
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+          'August', 'September', 'October', 'November', 'December']
+ORDINALS = ['1st', '2nd', '3rd', '4th']
+
+@functools.lru_cache(maxsize=None)
+def full_history(series_id, latest_year=2022, latest_month=6):
+    '''
+    Observations for one series since 1960, oldest first: quarterly for the
+    earnings (LEU) series and monthly otherwise, as in the real data. Values are
+    a deterministic random walk seeded by the series ID.
+    '''
+    rng = random.Random(zlib.crc32(series_id.encode('utf-8')))
+    step = 3 if series_id.startswith('LEU') else 1
+    value, rows = 100.0, []
+    for year in range(1960, latest_year + 1):
+        for month in range(step, 13, step):
+            if (year, month) > (latest_year, latest_month):
+                break
+            value *= 1 + rng.gauss(0.003, 0.005) * step
+            rows.append({
+                'year': str(year),
+                'period': 'Q%02d' % (month // 3) if step == 3 else 'M%02d' % month,
+                'periodName': ORDINALS[month // 3 - 1] + ' Quarter' if step == 3 else MONTHS[month - 1],
+                'value': value,
+                'footnotes': [{}],
+            })
+    rows[-1]['latest'] = 'true'
+    return rows
+
+def series_data(series_id, start_year, end_year, latest=(2022, 6), revision=0.0):
+    '''
+    Observations for one series between start_year and end_year, newest first, as
+    the API returns them, for data published through the latest (year, month).
+    Values in the 12 months before the latest are scaled by 1 + revision to
+    imitate revised estimates.
+    '''
+    out = []
+    for r in full_history(series_id, *latest):
+        if start_year <= int(r['year']) <= end_year:
+            month = int(r['period'][1:]) * (3 if r['period'][0] == 'Q' else 1)
+            months_back = (latest[0] - int(r['year'])) * 12 + latest[1] - month
+            value = r['value'] * (1 + revision) if months_back < 12 else r['value']
+            out.append(dict(r, value='%.3f' % value))
+    return out[::-1]
+
+class StubServer(object):
+    '''
+    Serves the stub API on a background thread; use as a context manager.
+    Tracks how many requests it received and the most it handled at once.
+    '''
+
+    def __init__(self, port=0, latency=0.0, fail_rate=0.0, seed=0, latest=(2022, 6), revision=0.0):
+        self.latency = latency
+        self.latest = latest
+        self.revision = revision
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+
+        stub = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # Keep-alive, so pooled connections are reused.
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                status, payload = stub.respond(body)
+                out = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.url = 'http://127.0.0.1:%d/publicAPI/v2/timeseries/data/' % self.server.server_port
+
+    def respond(self, body):
+        with self.lock:
+            self.requests += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            fail = self.rng.random() < self.fail_rate
+        try:
+            time.sleep(self.latency)
+            if fail:
+                return 503, {'status': 'REQUEST_NOT_PROCESSED', 'message': ['Service unavailable'], 'Results': {}}
+
+            request = json.loads(body)
+            series_ids = request.get('seriesid', [])
+            start_year, end_year = int(request['startyear']), int(request['endyear'])
+            if len(series_ids) > 50 or end_year - start_year + 1 > 20 or end_year < start_year:
+                return 200, {'status': 'REQUEST_NOT_PROCESSED', 'responseTime': 0,
+                             'message': ['Request exceeds the series or year limit'], 'Results': {}}
+
+            series = [{'seriesID': s, 'data': series_data(s, start_year, end_year, self.latest, self.revision)} for s in series_ids]
+            return 200, {'status': 'REQUEST_SUCCEEDED', 'responseTime': int(self.latency * 1000),
+                         'message': [], 'Results': {'series': series}}
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+def check():
+    '''
+    Pulls 150 series over 1970-2022 from a flaky, slow stub: sequentially with
+    one worker, then concurrently, then again from the checkpoints alone.
+    '''
+    from bls_fetch import BLSFetcher, plan_batches
+
+    series_ids = ['CUSR%07d' % i for i in range(150)]
+    batches = plan_batches(series_ids, 1970, 2022)
+    print('%d batches: %s' % (len(batches), [(len(b[0]), b[1], b[2]) for b in batches[:4]]))
+
+    checkpoints = tempfile.mkdtemp()
+    try:
+        results = {}
+        for label, workers, ckpt in [('sequential', 1, None), ('concurrent', 4, checkpoints), ('checkpoints', 4, checkpoints)]:
+            with StubServer(latency=1.0, fail_rate=0.15, seed=1) as stub:
+                fetcher = BLSFetcher(api_key='stub', url=stub.url, workers=workers, backoff=0.05,
+                                     max_per_second=None, checkpoint_dir=ckpt)
+                t = time.perf_counter()
+                results[label] = fetcher.fetch(series_ids, 1970, 2022)
+                print('%-12s %6.2fs  %5d rows  %2d requests to stub  %d in flight at most' % (
+                    label, time.perf_counter() - t, len(results[label]), stub.requests, stub.max_active))
+    finally:
+        shutil.rmtree(checkpoints)
+
+    first = results['sequential'].reset_index(drop=True)
+    for label in ['concurrent', 'checkpoints']:
+        assert first.astype(str).equals(results[label].reset_index(drop=True).astype(str)), label
+    assert len(first) == 150 * (52 * 12 + 6)
+    print('all pulls returned identical rows')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--check', action='store_true')
+    args = parser.parse_args()
+
+    if args.check:
+        check()
+    else:
+        with StubServer(args.port, args.latency, args.fail_rate) as stub:
+            print('Serving stub BLS API at ' + stub.url)
+            try:
+                stub.thread.join()
+            except KeyboardInterrupt:
+                pass
@@ -0,0 +1,321 @@
+'''
+Builds combined_data from the BLS API and the stock spreadsheet, either in full
+(the steps in Final_Data_Pull.ipynb) or incrementally from the last snapshot.
+
+    python pipeline.py full      # Pull 1970 to present and write a snapshot.
+    python pipeline.py refresh   # Pull only the years after each series' latest observation.
+    python pipeline.py verify    # Full pull in memory; compare its checksum with the current snapshot.
+
+Stock prices come from the stock spreadsheet plus any CSV or Excel price files
+in stocks/, streamed into monthly aggregates by stock_ingest.py.
+
+Snapshots live in snapshots/<version>/ with a manifest.json (row counts, latest
+date per series, checksum); snapshots/CURRENT names the newest. --publish also
+copies the new snapshot to combined_data.pkl and the combined_data bundle.
+'''
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'Flask'))
+
+from bls_fetch import BLSFetcher
+from schema import compact, validate
+from stock_ingest import monthly_prices
+
+CPI_TARGETS = 'CPI_Category_Tree_Final - REVISED.xlsx'
+OTHER_TARGETS = 'Other_BLS_Data_Final - REVISED.xlsx'
+STOCKS = 'Stock_Markets_Data - REVISED.xlsx'
+FIRST_YEAR = 1970
+RAW_COLS = ['year', 'period', 'periodName', 'latest', 'value', 'footnotes', 'series']
+
+def cpi_frame(df, targets):
+    '''
+    Adds the CPI category tree metadata to raw API rows and parses dates and values.
+    '''
+    df = df.copy()
+
+    # Merge other data into results from API pull.
+    targets = targets.set_index('Series ID')
+    df['Category'] = df['series'].map(targets['Revised Name with CPI'])
+    df['Parent Series ID'] = df['series'].map(targets['Parent Series ID'])
+    df['Level'] = df['series'].map(targets['Level'])
+    df['Leaf'] = df['series'].map(targets['Leaf'])
+
+    # Convert month and year to a datetime column.
+    df['date'] = pd.to_datetime(df.year.astype(str) + '/' + df.period.str[1:] + '/01')
+
+    # Make sure values are stored as numbers and not as strings.
+    df['value'] = df['value'].astype(float)
+
+    return df
+
+def other_frame(df, targets):
+    '''
+    Adds type and bucket labels to raw API rows for the non-CPI series, moves
+    quarterly observations to the last month of the quarter, and parses dates and values.
+    '''
+    df = df.copy()
+
+    # Merge other data into results from API pull.
+    targets = targets.set_index('Series ID')
+    df['Category'] = df['series'].map(targets['Revised Category Name'])
+    df['Type'] = df['series'].map(targets['Type'])
+    df['Bucket'] = df['series'].map(targets['Bucket'])
+
+    # Convert quarter names to months.
+    df['period'] = df['period'].replace(['Q01', 'Q02', 'Q03', 'Q04'], ['M03', 'M06', 'M09', 'M12'])
+
+    # Convert month and year to a datetime column.
+    df['date'] = pd.to_datetime(df.year.astype(str) + '/' + df.period.str[1:] + '/01')
+
+    # Make sure values are stored as numbers and not as strings.
+    df['value'] = df['value'].astype(float)
+
+    return df
+
+def stock_paths(data_dir=HERE):
+    '''
+    The stock spreadsheet, then any further price files (CSV or Excel) in stocks/.
+    '''
+    extra = os.path.join(data_dir, 'stocks')
+    paths = sorted(os.path.join(extra, f) for f in os.listdir(extra) if f.lower().endswith(('.csv', '.xlsx'))) if os.path.isdir(extra) else []
+    return [os.path.join(data_dir, STOCKS)] + paths
+
+def stocks_frame(monthly):
+    '''
+    Turns monthly price aggregates (from stock_ingest) into combined rows: the month's
+    mean price, dated the first of the month.
+    '''
+    stocks = pd.DataFrame({
+        'Category': monthly['Category'].values,
+        'date': pd.to_datetime((monthly['month'].values - 1970 * 12).astype('datetime64[M]')),
+        'value': monthly['mean'].values,
+    })
+    stocks['year'] = stocks['date'].dt.year
+
+    # Add bucket labels
+    stocks['Type'] = 'Stocks'
+
+    return stocks
+
+def read_inputs(data_dir=HERE):
+    '''
+    Returns the CPI targets, non-CPI targets and monthly stock frame. Prices are
+    streamed in chunks, so only their monthly aggregates are ever held in memory.
+    '''
+    cpi_targets = pd.read_excel(os.path.join(data_dir, CPI_TARGETS), header=0)
+    other_targets = pd.read_excel(os.path.join(data_dir, OTHER_TARGETS), header=0)
+    stocks = stocks_frame(monthly_prices(stock_paths(data_dir)))
+    return cpi_targets, other_targets, stocks
+
+def combine(df, df2, stocks, cpi_targets, other_targets):
+    '''
+    Returns the combined dataset in the compact schema, rows ordered by the target
+    tables (then stocks by name) and by month, so the same observations always
+    produce the same file however they were pulled.
+    '''
+    combo_df = validate(compact(pd.concat([df, df2, stocks])))
+
+    order = list(dict.fromkeys(list(cpi_targets['Revised Name with CPI']) + list(other_targets['Revised Category Name'])))
+    order += sorted(set(combo_df['Category'].astype(str)) - set(order))
+    rank = combo_df['Category'].astype(str).map({c: i for i, c in enumerate(order)})
+    combo_df = combo_df.assign(_rank=rank.values).sort_values(['_rank', 'month'], kind='mergesort')
+
+    return combo_df.drop(columns='_rank').reset_index(drop=True)
+
+def month_text(month):
+    return '%04d-%02d' % (int(month) // 12, int(month) % 12 + 1)
+
+def checksum(df):
+    '''
+    SHA-1 of a combined frame's columns, dtypes and values, in row order.
+    '''
+    h = hashlib.sha1(json.dumps([[c, str(t)] for c, t in df.dtypes.items()]).encode('utf-8'))
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+def full_build(fetcher, end_year=None, data_dir=HERE):
+    '''
+    Pulls every series from FIRST_YEAR through end_year (default: this year).
+    '''
+    end_year = end_year or date.today().year
+    cpi_targets, other_targets, stocks = read_inputs(data_dir)
+
+    df = cpi_frame(fetcher.fetch(list(cpi_targets['Series ID']), FIRST_YEAR, end_year), cpi_targets)
+    df2 = other_frame(fetcher.fetch(list(other_targets['Series ID']), FIRST_YEAR, end_year), other_targets)
+
+    return combine(df, df2, stocks, cpi_targets, other_targets)
+
+def fetch_since(fetcher, since, end_year):
+    '''
+    Fetches each series from its own start year (series -> year); series that share
+    a start year are batched together.
+    '''
+    groups = {}
+    for series, year in since.items():
+        groups.setdefault(year, []).append(series)
+    frames = [fetcher.fetch(ids, year, end_year) for year, ids in sorted(groups.items()) if year <= end_year]
+    return pd.concat(frames) if frames else pd.DataFrame(columns=RAW_COLS)
+
+def merge_raw(old, fresh):
+    '''
+    Merges newly fetched API rows into the stored rows for the same series. Fresh
+    rows replace stored ones for the same period (revisions), and a series' old
+    "latest" flag is cleared once fresh rows for it arrive. Applying the same fresh
+    rows twice gives the same result.
+    '''
+    old = old.copy()
+    old.loc[old['series'].isin(set(fresh['series'])), 'latest'] = np.nan
+    both = pd.concat([fresh, old], ignore_index=True)
+    both['year'] = both['year'].astype(int)
+
+    # Stored quarterly rows already have their periods moved to months, as other_frame does.
+    both['period'] = both['period'].replace(['Q01', 'Q02', 'Q03', 'Q04'], ['M03', 'M06', 'M09', 'M12'])
+    return both.drop_duplicates(['series', 'year', 'period'], keep='first')
+
+def refresh(store, fetcher, overlap_years=1, end_year=None, data_dir=HERE):
+    '''
+    Builds the next dataset from the current snapshot, requesting only the years
+    from overlap_years before each series' latest observation onward (so recent
+    revisions are picked up). Series new to the target tables are pulled in full
+    and series dropped from them are removed. Returns the combined frame.
+    '''
+    end_year = end_year or date.today().year
+    cpi_targets, other_targets, stocks = read_inputs(data_dir)
+    old = store.read()
+
+    # Stored observations, back in the shape the API returns them.
+    old = old[old['series'].notna()][RAW_COLS].astype(object)
+    old['series'] = old['series'].astype(str)
+    latest_year = old.groupby('series')['year'].max()
+
+    frames = []
+    for targets, to_frame in [(cpi_targets, cpi_frame), (other_targets, other_frame)]:
+        ids = list(dict.fromkeys(targets['Series ID']))
+        since = {s: int(latest_year[s]) - overlap_years if s in latest_year else FIRST_YEAR for s in ids}
+        fresh = fetch_since(fetcher, since, end_year)
+        frames.append(to_frame(merge_raw(old[old['series'].isin(ids)], fresh), targets))
+
+    return combine(frames[0], frames[1], stocks, cpi_targets, other_targets)
+
+class SnapshotStore(object):
+    '''
+    Directory of versioned dataset snapshots, each a compact-schema pickle plus a
+    manifest. CURRENT holds the newest version and is replaced atomically, so
+    readers never see a half-written snapshot.
+    '''
+
+    def __init__(self, root):
+        self.root = root
+
+    def current(self):
+        try:
+            with open(os.path.join(self.root, 'CURRENT')) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def path(self, version=None):
+        version = version or self.current()
+        if version is None:
+            raise FileNotFoundError('no snapshots in %s yet; run a full build first' % self.root)
+        return os.path.join(self.root, version)
+
+    def read(self, version=None):
+        return validate(pd.read_pickle(os.path.join(self.path(version), 'combined_data.pkl')))
+
+    def manifest(self, version=None):
+        with open(os.path.join(self.path(version), 'manifest.json')) as f:
+            return json.load(f)
+
+    def write(self, df, mode, **info):
+        '''
+        Saves df as a new snapshot and makes it current. Returns its version.
+        '''
+        digest = checksum(df)
+        now = datetime.now(timezone.utc)
+        version = now.strftime('%Y%m%dT%H%M%SZ') + '-' + digest[:8]
+
+        per_series = df.groupby('Category', observed=True, sort=False).agg(
+            series=('series', 'first'), rows=('month', 'size'), first_month=('month', 'min'), last_month=('month', 'max'))
+        manifest = dict({
+            'version': version,
+            'created': now.isoformat(),
+            'mode': mode,
+            'parent': self.current(),
+            'checksum': digest,
+            'rows': len(df),
+            'series': {c: {'series': None if pd.isna(r.series) else str(r.series), 'rows': int(r.rows),
+                           'min_date': month_text(r.first_month), 'max_date': month_text(r.last_month)}
+                       for c, r in per_series.iterrows()},
+        }, **info)
+
+        path = os.path.join(self.root, version)
+        os.makedirs(path)
+        df.to_pickle(os.path.join(path, 'combined_data.pkl'))
+        with open(os.path.join(path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=1)
+
+        tmp = os.path.join(self.root, 'CURRENT.tmp')
+        with open(tmp, 'w') as f:
+            f.write(version + '\n')
+        os.replace(tmp, os.path.join(self.root, 'CURRENT'))
+
+        return version
+
+    def publish(self, version=None, data_dir=HERE):
+        '''
+        Copies a snapshot to combined_data.pkl and rewrites the combined_data bundle.
+        '''
+        from dataset import Dataset
+
+        src = os.path.join(self.path(version), 'combined_data.pkl')
+        tmp = os.path.join(data_dir, 'combined_data.pkl.tmp')
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, os.path.join(data_dir, 'combined_data.pkl'))
+        Dataset(self.read(version)).save(os.path.join(data_dir, 'combined_data'))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('mode', choices=['full', 'refresh', 'verify'])
+    parser.add_argument('--store', default=os.path.join(HERE, 'snapshots'))
+    parser.add_argument('--api-key', default=None, help='BLS registration key (default: $BLS_API_KEY).')
+    parser.add_argument('--url', default=None, help='API endpoint, e.g. a bls_stub.py server.')
+    parser.add_argument('--end-year', type=int, default=None)
+    parser.add_argument('--overlap-years', type=int, default=1, help='Years before each latest observation to re-request for revisions.')
+    parser.add_argument('--publish', action='store_true')
+    args = parser.parse_args(argv)
+
+    store = SnapshotStore(args.store)
+    fetcher = BLSFetcher(api_key=args.api_key, **({'url': args.url} if args.url else {}))
+
+    if args.mode == 'verify':
+        expected = checksum(full_build(fetcher, args.end_year))
+        actual = store.manifest()['checksum']
+        print('current %s  %s\nrebuild %s  (%d API requests)' % (actual, store.current(), expected, fetcher.requests_sent))
+        print('MATCH' if actual == expected else 'MISMATCH')
+        return 0 if actual == expected else 1
+
+    if args.mode == 'full':
+        df = full_build(fetcher, args.end_year)
+    else:
+        df = refresh(store, fetcher, args.overlap_years, args.end_year)
+    version = store.write(df, args.mode, api_requests=fetcher.requests_sent)
+    print('wrote %s: %d rows, %d API requests' % (version, len(df), fetcher.requests_sent))
+
+    if args.publish:
+        store.publish(version)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+'''
+Streams price histories (daily or finer) into monthly aggregates per instrument,
+reading the files in chunks so memory depends on the number of instrument-months,
+not on how many prices there are.
+
+    python stock_ingest.py FILE [FILE ...] [--chunksize 100000] [--out monthly.csv]
+
+Files are CSV or Excel (.xlsx, opened read-only) with a date column, an
+instrument column ('Revised Category', else 'Category') and a 'value' column.
+Rows may come in any order. For each instrument and month the aggregates are
+the number of prices, their mean, the first and last by date, and the low and high.
+'''
+import argparse
+import resource
+import sys
+
+import numpy as np
+import pandas as pd
+
+KEYS = ['Category', 'month']
+
+def read_chunks(path, chunksize=100000):
+    '''
+    Yields the prices in a CSV or Excel file as frames of up to chunksize rows with
+    columns date, Category and value.
+    '''
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        chunks = excel_chunks(path, chunksize)
+    else:
+        chunks = pd.read_csv(path, chunksize=chunksize)
+    for chunk in chunks:
+        name = 'Revised Category' if 'Revised Category' in chunk.columns else 'Category'
+        yield pd.DataFrame({
+            'date': pd.to_datetime(chunk['date']),
+            'Category': chunk[name].astype(str),
+            'value': pd.to_numeric(chunk['value'], errors='coerce'),
+        })
+
+def excel_chunks(path, chunksize):
+    '''
+    Yields the first sheet of a workbook as frames of up to chunksize rows, streaming
+    it row by row (openpyxl's read-only mode) instead of loading the whole sheet.
+    '''
+    import openpyxl
+
+    book = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = book.worksheets[0].iter_rows(values_only=True)
+        header = [str(c) for c in next(rows)]
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunksize:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        book.close()
+
+def summarize(prices):
+    '''
+    Monthly aggregates of one frame of prices, one row per instrument and month
+    (months since year 0, as in the compact schema).
+    '''
+    prices = prices.dropna(subset=['date', 'value'])
+    dates = prices['date'].values
+    months = dates.astype('datetime64[M]').astype(np.int64) + 1970 * 12
+    # In date order, so each group's first and last are its earliest and latest. Files are usually sorted already.
+    prices = prices.assign(month=months).sort_values('date', kind='mergesort')
+
+    groups = prices.groupby(KEYS, sort=False)
+    out = groups['value'].agg(['count', 'sum', 'min', 'max', 'first', 'last'])
+    out['first_date'] = groups['date'].first()
+    out['last_date'] = groups['date'].last()
+    return out.reset_index()
+
+def fold(parts):
+    '''
+    Combines partial aggregates for overlapping instrument-months into one row each.
+    '''
+    parts = pd.concat(parts, ignore_index=True)
+    groups = parts.groupby(KEYS, sort=False)
+    out = groups.agg({'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max'})
+
+    # The first price is the earliest first of any part, and the last the latest last.
+    first = parts.sort_values('first_date', kind='mergesort').drop_duplicates(KEYS).set_index(KEYS)
+    last = parts.sort_values('last_date', kind='mergesort').drop_duplicates(KEYS, keep='last').set_index(KEYS)
+    for col in ['first', 'first_date']:
+        out[col] = first[col].reindex(out.index).values
+    for col in ['last', 'last_date']:
+        out[col] = last[col].reindex(out.index).values
+    return out.reset_index()
+
+class MonthlyPrices(object):
+    '''
+    Running monthly aggregates of prices added chunk by chunk. Chunks are summarized
+    as they arrive and folded into the totals once the pending summaries outgrow
+    them, so each price is handled a bounded number of times.
+    '''
+
+    def __init__(self, min_pending=10000):
+        self.min_pending = min_pending
+        self.rows = 0
+        self._totals = None
+        self._pending = []
+        self._pending_rows = 0
+
+    def add(self, prices):
+        self.rows += len(prices)
+        part = summarize(prices)
+        self._pending.append(part)
+        self._pending_rows += len(part)
+        if self._pending_rows > max(self.min_pending, 0 if self._totals is None else len(self._totals)):
+            self._fold()
+
+    def _fold(self):
+        parts = self._pending if self._totals is None else [self._totals] + self._pending
+        if parts:
+            self._totals = fold(parts)
+        self._pending = []
+        self._pending_rows = 0
+
+    def monthly(self):
+        '''
+        The aggregates so far: Category, month, count, mean, first, last, low and
+        high, ordered by instrument and month.
+        '''
+        self._fold()
+        if self._totals is None:
+            return pd.DataFrame(columns=KEYS + ['count', 'mean', 'first', 'last', 'low', 'high'])
+        out = self._totals.sort_values(KEYS, kind='mergesort').reset_index(drop=True)
+        out['mean'] = out['sum'] / out['count']
+        out = out.rename(columns={'min': 'low', 'max': 'high'})
+        return out[KEYS + ['count', 'mean', 'first', 'last', 'low', 'high']]
+
+def monthly_prices(paths, chunksize=100000):
+    '''
+    Monthly aggregates of every price in the files.
+    '''
+    prices = MonthlyPrices()
+    for path in paths:
+        for chunk in read_chunks(path, chunksize):
+            prices.add(chunk)
+    return prices.monthly()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--chunksize', type=int, default=100000)
+    parser.add_argument('--out', default=None, help='CSV to write the monthly aggregates to.')
+    args = parser.parse_args(argv)
+
+    prices = MonthlyPrices()
+    for path in args.files:
+        for chunk in read_chunks(path, args.chunksize):
+            prices.add(chunk)
+    monthly = prices.monthly()
+    if args.out:
+        monthly.to_csv(args.out, index=False)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print('%d prices -> %d instrument-months (%d instruments), peak RSS %.0f MB' % (
+        prices.rows, len(monthly), monthly['Category'].nunique(), peak))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+
+# Fewest months two series must share for a correlation over the whole window.
+MIN_COUNT = 12
+
+# Bytes of working arrays rolling() may use at once; pairs are processed in blocks to stay within it.
+BLOCK_BYTES = 64 * 1024 * 1024
+
+def aligned(df, column='yoy_change'):
+    '''
+    Lays out a chart's rows (data_parse() output) as one array of column values per
+    series over a shared run of months, NaN where a series has no value. Returns
+    (series, first, X): series holds Category and series ID per row of X, and
+    column t of X is month first + t (months since year 0).
+    '''
+    keep = df[column].notna().values
+    codes = df['code'].values[keep].astype(np.int64)
+    months = df['month'].values[keep].astype(np.int64)
+    if len(codes) == 0:
+        return pd.DataFrame(columns=['Category', 'series']), 0, np.empty((0, 0))
+
+    # Number the series that have values, in the order the chart lists them.
+    present, rows = np.unique(codes, return_inverse=True)
+    first = int(months.min())
+    X = np.full((len(present), int(months.max()) - first + 1), np.nan)
+    X[rows, months - first] = df[column].values[keep]
+
+    series = df.drop_duplicates('code').set_index('code').loc[present, ['Category', 'series']].reset_index(drop=True)
+    return series, first, X
+
+def moments(A, B):
+    '''
+    Sums over the months both series have, for every row of A against every row of
+    B: (count, sum a, sum b, sum a^2, sum b^2, sum ab), each len(A) x len(B). Each
+    is one matrix product, with NaN months masked out.
+    '''
+    ma, mb = ~np.isnan(A), ~np.isnan(B)
+    a, b = np.where(ma, A, 0.0), np.where(mb, B, 0.0)
+    ma, mb = ma.astype(np.float64), mb.astype(np.float64)
+    return ma @ mb.T, a @ mb.T, ma @ b.T, (a * a) @ mb.T, ma @ (b * b).T, a @ b.T
+
+def correlation(n, sa, sb, saa, sbb, sab, min_count):
+    '''
+    Pearson correlations from moments(), NaN where fewer than min_count months are
+    shared or either series is constant over them.
+    '''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = n * sab - sa * sb
+        va = n * saa - sa * sa
+        vb = n * sbb - sb * sb
+        r = cov / np.sqrt(va * vb)
+    r[(n < min_count) | ~(va > 1e-12 * n * n) | ~(vb > 1e-12 * n * n)] = np.nan
+    return np.clip(r, -1, 1)
+
+def centered(X):
+    '''
+    X less each row's mean, which keeps the sums above small and their differences exact.
+    '''
+    counts = (~np.isnan(X)).sum(axis=1)
+    means = np.where(counts > 0, np.nansum(X, axis=1) / np.maximum(counts, 1), 0.0)
+    return X - means[:, None]
+
+def lead_lag(X, max_lag, min_count=MIN_COUNT):
+    '''
+    Correlations of every pair of rows of X at every lead or lag up to max_lag
+    months. Returns (corr, lag, lag_corr): the correlations at lag 0, and per pair
+    the lag whose correlation is strongest and that correlation. lag[i, j] = k
+    means row i at month t goes best with row j at month t + k, i.e. i leads j by
+    k months (a negative k: j leads i).
+    '''
+    n, T = X.shape
+    corr = correlation(*moments(X, X), min_count)
+    lag = np.zeros((n, n), dtype=np.int64)
+    lag_corr = corr.copy()
+    best = np.where(np.isnan(corr), -1.0, np.abs(corr))
+
+    # One pass per lag covers both directions: the correlation of i then j at lag -k is that of j then i at lag k.
+    for k in range(1, min(max_lag, T - 1) + 1):
+        r = correlation(*moments(X[:, :T - k], X[:, k:]), min_count)
+        for corr_k, lag_k in ((r, k), (r.T, -k)):
+            better = np.abs(corr_k) > best
+            lag[better] = lag_k
+            lag_corr[better] = corr_k[better]
+            best[better] = np.abs(corr_k[better])
+
+    return corr, lag, lag_corr
+
+def window_sums(v, window):
+    '''
+    Sums of each row of v over the `window` columns ending at every column, from one cumulative sum.
+    '''
+    c = np.cumsum(v, axis=1)
+    out = c.copy()
+    out[:, window:] -= c[:, :-window]
+    return out
+
+def rolling(X, window, i, j, min_count=None):
+    '''
+    Correlations of rows i[p] and j[p] of X over the `window` months ending at every
+    month, one row per pair. Shared-month counts and sums over each window come from
+    cumulative sums along the months, for a block of pairs at a time.
+    '''
+    min_count = max(3, window // 3) if min_count is None else min_count
+    T = X.shape[1]
+    mask = ~np.isnan(X)
+    x = np.where(mask, X, 0.0)
+    mask = mask.astype(np.float64)
+    out = np.full((len(i), T), np.nan)
+
+    block = max(1, BLOCK_BYTES // (max(T, 1) * 8 * 12))
+    for s in range(0, len(i), block):
+        a, b = i[s:s + block], j[s:s + block]
+        both = mask[a] * mask[b]
+        xa, xb = x[a] * both, x[b] * both
+        sums = [window_sums(v, window) for v in (both, xa, xb, xa * xa, xb * xb, xa * xb)]
+        out[s:s + block] = correlation(*sums, min_count)
+    return out
+
+class Correlations(object):
+    '''
+    How the series in a chart move together: the correlations of their values of
+    column over the chart's window, the lead or lag (up to max_lag months) at which
+    each pair lines up best, and each pair's correlation over the latest
+    `window` months. rolling() gives any pairs' correlations over every
+    `window`-month span.
+
+    len() is the number of bytes its arrays hold, so results can be kept in the chart cache.
+    '''
+
+    def __init__(self, df, column='yoy_change', window=36, max_lag=12, min_count=MIN_COUNT):
+        self.column = column
+        self.window = window
+        self.max_lag = max_lag
+        self.series, self.first, X = aligned(df, column)
+        self.X = centered(X)
+        self.corr, self.lag, self.lag_corr = lead_lag(self.X, max_lag, min_count)
+
+        # The last window of the rolling correlations, for every pair at once.
+        recent = self.X[:, -window:]
+        self.last = correlation(*moments(recent, recent), max(3, window // 3))
+        np.fill_diagonal(self.last, 1.0)
+
+    def __len__(self):
+        return sum(a.nbytes for a in (self.X, self.corr, self.lag, self.lag_corr, self.last)) + 200 * len(self.series)
+
+    def rolling(self, i, j):
+        '''
+        Rolling correlations of the pairs of series positions (i[p], j[p]), one row
+        per pair and one column per month from the end of the first full window.
+        '''
+        return rolling(self.X, self.window, np.asarray(i, dtype=np.int64), np.asarray(j, dtype=np.int64))[:, self.window - 1:]
+
+    def months(self):
+        '''
+        The months (since year 0) that rolling() columns end at.
+        '''
+        return np.arange(self.first + self.window - 1, self.first + self.X.shape[1])
+
+    def heatmap(self):
+        '''
+        One row per ordered pair of series: their Categories and positions, the
+        correlation, the best lead or lag and its correlation, and the correlation
+        over the latest window.
+        '''
+        n = len(self.series)
+        i, j = np.divmod(np.arange(n * n), n)
+        names = self.series['Category'].values
+        return pd.DataFrame({
+            'x': names[j],
+            'y': names[i],
+            'xi': j,
+            'yi': i,
+            'corr': self.corr.ravel().round(3),
+            'lag': self.lag.ravel(),
+            'lag_corr': self.lag_corr.ravel().round(3),
+            'last': self.last.ravel().round(3),
+        })
+
+    def payload(self, i, j):
+        '''
+        The results as JSON-ready lists (None for NaN), with rolling correlations for
+        the pairs of series positions (i[p], j[p]).
+        '''
+        return {
+            'column': self.column,
+            'window': self.window,
+            'max_lag': self.max_lag,
+            'series': {col: [None if pd.isna(v) else str(v) for v in self.series[col]] for col in ['Category', 'series']},
+            'corr': listed(self.corr),
+            'lag': self.lag.tolist(),
+            'lag_corr': listed(self.lag_corr),
+            'last': listed(self.last),
+            'rolling': {
+                'months': self.months().tolist(),
+                'pairs': np.column_stack([i, j]).tolist(),
+                'values': listed(self.rolling(i, j)),
+            },
+        }
+
+def listed(a, digits=3):
+    '''
+    A float array as nested lists rounded to digits, with None for NaN (JSON has no NaN).
+    '''
+    a = a.round(digits)
+    return np.where(np.isnan(a), None, a).tolist()
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+def parse_weights(text):
+    '''
+    Parses "SERIES:WEIGHT,SERIES:WEIGHT,..." (e.g. "CUSR0000SAF11:15,CUSR0000SAH:40")
+    into a dict. Raises ValueError on anything else or a negative weight.
+    '''
+    weights = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        series, sep, weight = item.partition(':')
+        if not sep:
+            raise ValueError('expected SERIES:WEIGHT, got %r' % item)
+        weights[series.strip()] = weights.get(series.strip(), 0.0) + float(weight)
+    return check_weights(weights)
+
+def check_weights(weights):
+    '''
+    Returns weights (series -> number) as floats, raising ValueError if any is
+    negative or not a finite number.
+    '''
+    if not isinstance(weights, dict):
+        raise ValueError('weights must map series IDs to numbers')
+    out = {}
+    for series, weight in weights.items():
+        weight = float(weight)
+        if not np.isfinite(weight) or weight < 0:
+            raise ValueError('weight for %s must be a non-negative number' % series)
+        out[str(series)] = weight
+    return out
+
+def basket(ds, weights, start_year, end_year):
+    '''
+    A personal price index: CPI series weighted by the shares in weights (series
+    ID -> weight, at any level of the category tree; a group's weight follows that
+    group's own index). Prices are fixed-basket relatives to January of start_year,
+    so the index is one matrix-vector product of the weights (divided by those base
+    prices) with the dense series x month grid.
+
+    Returns (frame, used, excluded): the index (100 in January of start_year) with
+    its cumulative and annual change per month through end_year; the series used,
+    with their shares; and the series left out, with why.
+    '''
+    start_year, end_year = int(start_year), int(end_year)
+    first, grid = ds.grid()
+    meta = ds.meta
+    cpi = meta['Type'].isna().values
+    base_col = start_year * 12 - first
+
+    used, excluded = {}, {}
+    for series, weight in weights.items():
+        pos = ds.tree.pos.get(series)
+        if pos is None or not cpi[pos]:
+            excluded[series] = 'not a CPI series'
+        elif weight == 0:
+            continue
+        elif not 0 <= base_col < grid.shape[1] or np.isnan(grid[pos, base_col]):
+            excluded[series] = 'no data for January %d' % start_year
+        else:
+            used[pos] = used.get(pos, 0.0) + weight
+
+    cols = ['date', 'index', 'change', 'yoy_change']
+    total = sum(used.values())
+    if not used or total == 0 or start_year > end_year:
+        return pd.DataFrame(columns=cols), {}, excluded
+
+    rows = np.fromiter(used, dtype=np.int64)
+    share = np.fromiter(used.values(), dtype=np.float64) / total
+
+    # Twelve months before the window as well, for the annual change of its first year.
+    lo = max(base_col - 12, 0)
+    hi = min((end_year + 1) * 12 - first, grid.shape[1])
+    index = (share / grid[rows, base_col]) @ grid[rows, lo:hi]
+
+    lag = np.full(len(index), np.nan)
+    lag[12:] = index[:-12]
+    window = slice(base_col - lo, None)
+    index, lag = index[window], lag[window]
+
+    frame = pd.DataFrame({
+        'date': (np.arange(base_col, hi) + first - 1970 * 12).astype('datetime64[M]').astype('datetime64[ns]'),
+        'index': (index * 100).round(3),
+        'change': (index - 1).round(6),
+        'yoy_change': (index / lag - 1).round(6),
+    }, columns=cols)
+
+    # Drop trailing months some series have not been published for yet.
+    published = np.flatnonzero(~np.isnan(index))
+    frame = frame.iloc[:published[-1] + 1] if len(published) else frame.iloc[:0]
+
+    names = meta['series'].values[rows]
+    shares = {name: round(s, 6) for name, s in zip(names, share.tolist())}
+    return frame, shares, excluded
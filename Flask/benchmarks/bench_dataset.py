@@ -0,0 +1,88 @@
+'''
+Compares memory and latency of data_parse on the read-only Dataset, with and
+without the precomputed change cube, against the original deep-copy path.
+
+    python benchmarks/bench_dataset.py [path/to/combined_data.pkl]
+'''
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+warnings.filterwarnings('ignore')
+
+from dataset import Dataset
+from legacy import legacy_data_parse
+from queries import drill_down_parent
+
+def queries(tree):
+    '''
+    The selections measured. The drill-down goes into the group drill_down_parent
+    finds in the dataset's tree (Food at home in the BLS data), so synthetic
+    datasets work too.
+    '''
+    return {
+        'total_2000_2021': {'start_year': '2000', 'end_year': '2021', 'inflation': 'Total'},
+        'by_category_1970_2021': {'start_year': '1970', 'end_year': '2021', 'inflation': 'By Category'},
+        'drill_down_group': {'start_year': '1990', 'end_year': '2021', 'inflation': 'By Category', 'parent': drill_down_parent(tree)},
+        'everything_1970_2021': {'start_year': '1970', 'end_year': '2021', 'inflation': 'By Category',
+                                 'earnings': 'By Race', 'unemployment': 'By Education', 'stocks': 'Include'},
+    }
+
+def measure(fn, repeat=50):
+    '''
+    Returns (p50 seconds, p99 seconds, peak traced bytes) for a callable.
+    '''
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return np.percentile(times, 50), np.percentile(times, 99), peak
+
+def main(path):
+
+    df = pd.read_pickle(path)
+    ds = Dataset(df)
+    ds_no_cube = Dataset(df, cube=False)
+
+    # Import after the Dataset exists so data_parse runs exactly as it does in the app.
+    with contextlib.redirect_stdout(io.StringIO()):
+        from flaskapp import data_parse
+
+    print('rows: %d, full frame: %.1f MB, dataset arrays: %.1f MB, change cube: %.1f MB (%d start years)' % (
+        len(df), df.memory_usage(deep=True).sum() / 1e6, (ds.dates.nbytes + ds.values.nbytes) / 1e6,
+        (ds.change_cube.nbytes + ds.yoy.nbytes) / 1e6, len(ds.cube_years)))
+
+    paths = [
+        ('legacy', lambda args: legacy_data_parse(df.copy(deep=True), **args)),
+        ('no cube', lambda args: data_parse(ds_no_cube, **args)),
+        ('cube', lambda args: data_parse(ds, **args)),
+    ]
+    # The original data_parse needs the original layout (a 'date' column, plain strings), which synthetic data does not have.
+    if 'date' not in df.columns:
+        print('not in the original layout; skipping the legacy path')
+        paths = paths[1:]
+    print('%-24s %-8s %10s %10s %10s' % ('query', 'path', 'p50 ms', 'p99 ms', 'peak MB'))
+    for name, args in queries(ds.tree).items():
+        for label, fn in paths:
+            with contextlib.redirect_stdout(io.StringIO()):
+                p50, p99, peak = measure(lambda: fn(args))
+            print('%-24s %-8s %10.1f %10.1f %10.1f' % (name, label, p50 * 1e3, p99 * 1e3, peak / 1e6))
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else '/groups/inflation_viz/flaskapp/combined_data.pkl')
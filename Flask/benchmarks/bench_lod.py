@@ -0,0 +1,98 @@
+'''
+Points drawn and bytes sent by long line charts with every monthly point, and
+thinned to the point budget by calendar resolution or by LTTB.
+
+    python benchmarks/bench_lod.py [--budget 5000]
+
+"max err" is how far the thinned line (drawn straight between kept points)
+strays from the full monthly series, as a percentage of that series' range.
+"ends" checks every series still ends on exactly the value the bar chart for
+the same window shows.
+'''
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+warnings.filterwarnings('ignore')
+
+from category_tree import ROOT
+from queries import drill_down_parent
+
+def queries(tree):
+    '''
+    The charts compared, with series taken from the dataset's category tree so
+    synthetic datasets work too: group_leaves are the leaves of the first group two
+    levels down (Food at home in the BLS data).
+    '''
+    return {
+        'default_line': 'start_year=2000&end_year=2021',
+        'by_category_1970_2021': 'start_year=1970&end_year=2021&earnings=By+Race&unemployment=By+Education&stocks=Include',
+        'group_leaves_1970_2021': 'start_year=1970&end_year=2021&expand=Leaves&parent=' + drill_down_parent(tree),
+        'all_leaves_1970_2021': 'start_year=1970&end_year=2021&expand=Leaves&parent=' + ROOT,
+    }
+
+def max_error(full, thin):
+    '''
+    The largest gap between each full series and its thinned copy interpolated at
+    the full dates, relative to the series' range.
+    '''
+    worst = 0.0
+    for category, rows in full.groupby('Category', sort=False):
+        kept = thin[thin['Category'] == category]
+        x, y = rows['date'].values.astype(np.int64), rows['change'].values
+        line = np.interp(x, kept['date'].values.astype(np.int64), kept['change'].values)
+        worst = max(worst, np.nanmax(np.abs(line - y)) / max(np.nanmax(y) - np.nanmin(y), 1e-9))
+    return worst * 100
+
+def main(budget):
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import flaskapp
+        from chart_cache import canonical_args
+        from chart_data import columnar_json
+    app = flaskapp.app
+    ds = flaskapp.datasets.current
+    app.config['CHART_POINT_BUDGET'] = budget
+
+    print('%-22s %-9s %7s %8s %-10s %10s %10s %9s %9s %5s' % (
+        'query', 'lod', 'series', 'points', 'resolution', 'inline B', 'data B', 'render ms', 'max err %', 'ends'))
+    for name, query in queries(ds.tree).items():
+        args = canonical_args(dict(p.split('=') for p in query.split('&')))
+        with contextlib.redirect_stdout(io.StringIO()):
+            t_df = flaskapp.data_parse(ds, **args)
+            bar = flaskapp.bar_data(t_df, **args).set_index('Category')['change']
+
+        app.config['CHART_LOD'] = None
+        full = flaskapp.line_data(t_df, **args)
+        for lod in [None, 'calendar', 'lttb']:
+            app.config['CHART_LOD'] = lod
+            thin = flaskapp.line_data(t_df, **args)
+            _, res = flaskapp.downsample(full, budget, lod) if lod else (full, 'monthly')
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                flaskapp.render_chart(ds, **args)
+                t = time.perf_counter()
+                html = flaskapp.render_chart(ds, **args)
+                render_ms = (time.perf_counter() - t) * 1e3
+                data = columnar_json(flaskapp.chart_data(ds, **args))
+
+            ends = thin.groupby('Category', sort=False)['change'].last()
+            at_end = bar.index.intersection(ends.index)
+            same_ends = ends.equals(full.groupby('Category', sort=False)['change'].last()) and np.allclose(ends[at_end], bar[at_end].round(3))
+            print('%-22s %-9s %7d %8d %-10s %10d %10d %9.1f %9.2f %5s' % (
+                name, lod or 'off', thin['Category'].nunique(), len(thin), res, len(html), len(data),
+                render_ms, max_error(full, thin), same_ends))
+        print()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget', type=int, default=5000)
+    args = parser.parse_args()
+    main(args.budget)
@@ -0,0 +1,41 @@
+'''
+Compares bytes on the wire for /chart with data inlined in the HTML against
+the 'url' data mode, where the spec and the /data response are sent separately.
+
+    python benchmarks/bench_payload.py
+'''
+import contextlib
+import io
+import os
+import re
+import sys
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+warnings.filterwarnings('ignore')
+
+from queries import chart_queries
+
+def main():
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import flaskapp
+    client = flaskapp.app.test_client()
+    QUERIES = chart_queries(flaskapp.datasets.current.tree)
+
+    print('%-22s %12s %12s %12s %12s' % ('query', 'inline B', 'url spec B', 'url data B', 'repeat B'))
+    for name, query in QUERIES.items():
+        with contextlib.redirect_stdout(io.StringIO()):
+            flaskapp.app.config['CHART_DATA_MODE'] = 'inline'
+            inline = client.get('/chart?' + query).data
+
+            flaskapp.app.config['CHART_DATA_MODE'] = 'url'
+            spec = client.get('/chart?' + query).data
+            url = re.search(rb'"url": "([^"]+)"', spec).group(1).decode('utf-8')
+            data = client.get('/' + url).data
+
+        # A repeat view only fetches the spec; the versioned data URL is served from the browser cache.
+        print('%-22s %12d %12d %12d %12d' % (name, len(inline), len(spec), len(data), len(spec)))
+
+if __name__ == '__main__':
+    main()
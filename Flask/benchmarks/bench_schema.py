@@ -0,0 +1,58 @@
+'''
+Compares the original object/float64 layout of combined_data with the compact
+schema in schema.py: file size and load time, memory held per worker, frame
+copy and filter times, and the time to build a Dataset from each.
+
+    python benchmarks/bench_schema.py [path/to/original_combined_data.pkl]
+'''
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+warnings.filterwarnings('ignore')
+
+from dataset import Dataset
+from schema import compact, validate
+
+def timed(fn, repeat=20):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return np.median(times) * 1e3
+
+def main(path):
+
+    original = pd.read_pickle(path)
+    if 'date' not in original.columns:
+        sys.exit('expected a pickle in the original (pre-schema) layout')
+    small = validate(compact(original))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        small_path = os.path.join(tmp, 'compact.pkl')
+        small.to_pickle(small_path)
+        sizes = os.path.getsize(path) / 1e6, os.path.getsize(small_path) / 1e6
+        loads = timed(lambda: pd.read_pickle(path), 5), timed(lambda: pd.read_pickle(small_path), 5)
+
+    print('%-30s %12s %12s' % ('', 'original', 'compact'))
+    print('%-30s %12.1f %12.1f' % ('pickle size MB', sizes[0], sizes[1]))
+    print('%-30s %12.1f %12.1f' % ('pickle load ms', loads[0], loads[1]))
+    print('%-30s %12.1f %12.1f' % ('frame memory MB', original.memory_usage(deep=True).sum() / 1e6, small.memory_usage(deep=True).sum() / 1e6))
+    print('%-30s %12.1f %12.1f' % ('deep copy ms', timed(lambda: original.copy(deep=True)), timed(lambda: small.copy(deep=True))))
+    print('%-30s %12.1f %12.1f' % ('filter Parent Series ID ms',
+        timed(lambda: original[original['Parent Series ID'] == 'CUSR0000SA0']),
+        timed(lambda: small[small['Parent Series ID'] == 'CUSR0000SA0'])))
+    print('%-30s %12.1f %12.1f' % ('filter Type & Bucket ms',
+        timed(lambda: original[(original['Type'] == 'Earnings') & (original['Bucket'] == 'By Race')]),
+        timed(lambda: small[(small['Type'] == 'Earnings') & (small['Bucket'] == 'By Race')])))
+    print('%-30s %12.1f %12.1f' % ('Dataset build ms', timed(lambda: Dataset(original), 3), timed(lambda: Dataset(small), 3)))
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else '/groups/inflation_viz/flaskapp/combined_data.pkl')
@@ -0,0 +1,98 @@
+'''
+Times turning a chart's rows into its HTML page: building, validating and
+serializing an Altair chart per request, against filling the precompiled
+template with rows encoded by records_json. Data selection (data_parse and the
+*_parts functions) is the same for both and left out of the timings.
+
+    python benchmarks/bench_spec.py [--repeat 5]
+
+Also checks each pair of pages describes the same chart: the specs, with named
+datasets replaced by their rows and selection names normalized, must be equal.
+'''
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+warnings.filterwarnings('ignore')
+
+from queries import chart_queries
+
+def resolved_spec(html):
+    '''
+    The chart spec in a page, with named datasets inlined where they are used.
+    '''
+    spec = json.loads(re.search(r'var spec = (\{.*?\});\n', html, re.S).group(1))
+    datasets = spec.pop('datasets', {})
+
+    def resolve(node):
+        if isinstance(node, dict):
+            if set(node) == {'name'} and node['name'] in datasets:
+                return {'values': datasets[node['name']]}
+            return {k: resolve(v) for k, v in node.items()}
+        if isinstance(node, list):
+            return [resolve(v) for v in node]
+        return node
+
+    return re.sub(r'selector\d+', 'selector', json.dumps(resolve(spec), sort_keys=True))
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t)
+    return min(times) * 1e3, out
+
+def main(repeat):
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import flaskapp
+        from chart_cache import canonical_args
+        from spec_compiler import records_json
+        import altair as alt
+    alt.data_transformers.enable('default', max_rows=20000)
+    ds = flaskapp.datasets.current
+    QUERIES = chart_queries(ds.tree)
+
+    print('%-22s %-6s %7s %10s %10s %10s %10s %10s %6s' % (
+        'query', 'mode', 'rows', 'altair ms', 'compile ms', 'fill ms', 'speedup', 'page B', 'same'))
+    for name, query in QUERIES.items():
+        args = canonical_args(dict(p.split('=') for p in query.split('&')))
+        with contextlib.redirect_stdout(io.StringIO()):
+            t_df = flaskapp.data_parse(ds, **args)
+        parts, spec = flaskapp.CHART_SPECS[args['chart_type']]
+        data, values = parts(t_df, **args)
+        args = dict(args, v=ds.version)
+
+        for mode in ['inline', 'url']:
+            flaskapp.app.config['CHART_DATA_MODE'] = mode
+            flaskapp.spec_compiler.clear()
+
+            altair_ms, altair_html = timed(lambda: spec(flaskapp.data_chart(data, **args), **values).to_html(embed_options={"actions":False}), repeat)
+            compile_ms, _ = timed(lambda: flaskapp.compiled_html(spec, data, args, **values), 1)
+            fill_ms, compiled_html = timed(lambda: flaskapp.compiled_html(spec, data, args, **values), repeat)
+            print('%-22s %-6s %7d %10.1f %10.1f %10.1f %9.0fx %10d %6s' % (
+                name, mode, len(data), altair_ms, compile_ms, fill_ms, altair_ms / fill_ms, len(compiled_html),
+                resolved_spec(altair_html) == resolved_spec(compiled_html)))
+
+    # The rows alone: Altair's sanitize + per-row dicts + json.dumps, against records_json.
+    args = canonical_args(dict(p.split('=') for p in QUERIES['everything_1970_2021'].split('&')))
+    with contextlib.redirect_stdout(io.StringIO()):
+        data, _ = flaskapp.line_parts(flaskapp.data_parse(ds, **args), **args)
+    altair_ms, a = timed(lambda: json.dumps(alt.utils.sanitize_dataframe(data).to_dict(orient='records')), repeat)
+    fast_ms, b = timed(lambda: records_json(data), repeat)
+    print('\nrows only, %d rows: altair %.1f ms (%d B), records_json %.1f ms (%d B), same values %s' % (
+        len(data), altair_ms, len(a), fast_ms, len(b), json.loads(a) == json.loads(b)))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    main(args.repeat)
@@ -0,0 +1,70 @@
+'''
+Compares cold import time and per-worker memory of flaskapp when it loads the
+pickle against a memory-mapped bundle written by Dataset.save().
+
+    python benchmarks/bench_startup.py [path/to/combined_data.pkl] [path/to/bundle]
+
+The bundle is created next to the pickle if it does not exist yet.
+'''
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(HERE, '..')
+sys.path.insert(0, APP_DIR)
+
+# Run in a fresh interpreter so nothing is already imported or cached.
+WORKER = '''
+import json, time, warnings
+warnings.filterwarnings('ignore')
+t = time.perf_counter()
+import flaskapp
+import_s = time.perf_counter() - t
+
+def status():
+    out = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(('VmRSS', 'RssAnon', 'RssFile')):
+                name, kb = line.split()[:2]
+                out[name.rstrip(':')] = int(kb) / 1024
+    return out
+
+after_import = status()
+t = time.perf_counter()
+flaskapp.app.test_client().get('/chart?chart_type=Line+Chart&start_year=1970&end_year=2021')
+first_chart_s = time.perf_counter() - t
+print(json.dumps({'import_s': import_s, 'first_chart_s': first_chart_s, 'import': after_import, 'chart': status()}))
+'''
+
+def run(data_path, repeat):
+    env = dict(os.environ, INFLATION_VIZ_DATA=data_path)
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', WORKER], cwd=APP_DIR, env=env, capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return runs
+
+def main(pickle_path, bundle_path, repeat=5):
+
+    if not os.path.isdir(bundle_path):
+        from dataset import Dataset
+        Dataset.from_pickle(pickle_path).save(bundle_path)
+
+    print('%-8s %10s %10s %12s %12s %12s %12s' % ('source', 'import s', 'chart s', 'RSS MB', 'anon MB', 'file MB', 'RSS@chart'))
+    for label, path in [('pickle', pickle_path), ('bundle', bundle_path)]:
+        runs = run(path, repeat)
+        med = lambda f: np.median([f(r) for r in runs])
+        print('%-8s %10.2f %10.2f %12.1f %12.1f %12.1f %12.1f' % (
+            label, med(lambda r: r['import_s']), med(lambda r: r['first_chart_s']),
+            med(lambda r: r['import']['VmRSS']), med(lambda r: r['import']['RssAnon']),
+            med(lambda r: r['import']['RssFile']), med(lambda r: r['chart']['VmRSS'])))
+
+if __name__ == '__main__':
+    pickle_path = sys.argv[1] if len(sys.argv) > 1 else '/groups/inflation_viz/flaskapp/combined_data.pkl'
+    bundle_path = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(pickle_path)[0]
+    main(pickle_path, bundle_path)
@@ -0,0 +1,249 @@
+'''
+Repeatable timings of the chart pipeline on synthetic datasets, saved as JSON so
+runs can be compared over time.
+
+    python benchmarks/bench_suite.py [--datasets base,series_x10] [--repeat 5] [--out results.json]
+    python benchmarks/bench_suite.py --compare old.json new.json [--threshold 20]
+
+Each dataset (see DATASETS, made by synthetic.py) is written as a bundle and
+served by a fresh process, which times for every selection, year window and
+chart type:
+
+    data_parse   selecting the series and their changes
+    build        build_line_v2, build_bar or build_heatmap (the Altair chart)
+    html         the chart's to_html
+    chart_miss   GET /chart through the Flask test client with an empty cache
+    chart_hit    the same request again, answered from the cache
+
+and records the min, median and 90th percentile in milliseconds. --compare
+lists the steps whose median moved by more than --threshold percent and exits
+non-zero if any got slower. A step that raises is recorded with its error.
+
+The dataset stores one value per series per month, so denser data (daily
+rather than monthly) is stood in for by longer histories: history_x4 has four
+times the points per series. pandas dates stop at 1677, about six times the
+default history. Datasets whose change cube would exceed CUBE_BYTES are served
+without one, as the app can be; results record which.
+'''
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+warnings.filterwarnings('ignore')
+
+END_YEAR = 2022
+
+DATASETS = {
+    'base': {'scale': 1, 'start_year': 1970},
+    'series_x10': {'scale': 10, 'start_year': 1970},
+    'series_x100': {'scale': 100, 'start_year': 1970},
+    'history_x4': {'scale': 1, 'start_year': END_YEAR - 4 * (END_YEAR - 1970)},
+}
+
+CUBE_BYTES = 1 << 30
+
+def selections(tree):
+    from category_tree import ROOT
+    from queries import drill_down_parent
+    return {
+        'total': {'inflation': 'Total'},
+        'categories': {'inflation': 'By Category'},
+        'drill_down': {'inflation': 'By Category', 'parent': drill_down_parent(tree)},
+        'leaves': {'inflation': 'By Category', 'parent': ROOT, 'expand': 'Leaves'},
+        'everything': {'inflation': 'By Category', 'earnings': 'By Race', 'unemployment': 'By Education', 'stocks': 'Include'},
+    }
+
+def windows(start_year):
+    last = END_YEAR - 1
+    return {'recent': (last - 5, last), 'full': (start_year, last)}
+
+def timings(fn, repeat, before=None):
+    '''
+    Runs fn once to warm up, then `repeat` times. Returns the millisecond summary and fn's last result.
+    '''
+    times = []
+    for i in range(repeat + 1):
+        if before:
+            before()
+        t = time.perf_counter()
+        out = fn()
+        if i:
+            times.append((time.perf_counter() - t) * 1e3)
+    summary = {'min': min(times), 'median': float(np.median(times)), 'p90': float(np.percentile(times, 90))}
+    return {k: round(v, 3) for k, v in summary.items()}, out
+
+def measure(records, record, fn, repeat, before=None, extra=None):
+    '''
+    Appends record with fn's timings (and extra(result), if given) to records, and
+    returns fn's result. A step that fails is recorded with its error instead.
+    '''
+    try:
+        ms, out = timings(fn, repeat, before)
+    except Exception as e:
+        records.append(dict(record, error='%s: %s' % (type(e).__name__, e)))
+        return None
+    records.append(dict(record, ms=ms, **(extra(out) if extra else {})))
+    return out
+
+def run_child(bundle, name, start_year, repeat):
+    '''
+    Times every step against the dataset bundle, in this process. Returns the result records.
+    '''
+    os.environ.update(INFLATION_VIZ_DATA=bundle, INFLATION_VIZ_RELOAD='0', INFLATION_VIZ_RENDER_WORKERS='0')
+    t = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        import flaskapp
+        from chart_cache import canonical_args
+    load_ms = (time.perf_counter() - t) * 1e3
+    app = flaskapp.app
+    ds = flaskapp.datasets.current
+    client = app.test_client()
+    builders = {'Line Chart': flaskapp.build_line_v2, 'Bar Chart': flaskapp.build_bar, 'Heatmap': flaskapp.build_heatmap}
+
+    records = [{'dataset': name, 'step': 'load', 'ms': {'min': round(load_ms, 3), 'median': round(load_ms, 3), 'p90': round(load_ms, 3)}}]
+    for selection, chosen in selections(ds.tree).items():
+        for window, (start, end) in windows(start_year).items():
+            query = dict(chosen, start_year=str(start), end_year=str(end))
+            base = {'dataset': name, 'selection': selection, 'window': window}
+
+            df = measure(records, dict(base, step='data_parse'), lambda: flaskapp.data_parse(ds, **canonical_args(query)), repeat,
+                         extra=lambda df: {'rows': len(df)})
+
+            for chart_type, build in builders.items():
+                args = canonical_args(dict(query, chart_type=chart_type))
+                url = '/chart?' + flaskapp.urlencode(args)
+                base = dict(base, chart_type=chart_type)
+
+                # render_chart applies Altair's settings, which build_* rely on.
+                flaskapp.render_chart(ds, **args)
+                chart = measure(records, dict(base, step='build'), lambda: build(df, **dict(args, v=ds.version)), repeat)
+                if chart is not None:
+                    measure(records, dict(base, step='html'), lambda: chart.to_html(embed_options={"actions":False}), repeat,
+                            extra=lambda html: {'bytes': len(html)})
+
+                response = lambda r: {'bytes': len(r.data), 'status': r.status_code}
+                measure(records, dict(base, step='chart_miss'), lambda: client.get(url), repeat, before=flaskapp.chart_cache.clear, extra=response)
+                measure(records, dict(base, step='chart_hit'), lambda: client.get(url), repeat, extra=response)
+
+    return records
+
+def environment(config):
+    '''
+    What the timings depend on besides the code: the commit (and whether it had
+    uncommitted changes), the machine and the app's chart settings.
+    '''
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=HERE, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=HERE, capture_output=True, text=True).stdout.strip())
+    except OSError:
+        commit, dirty = None, None
+    return {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'dirty': dirty,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'config': {k: config[k] for k in ('CHART_DATA_MODE', 'CHART_COMPILED', 'CHART_LOD', 'CHART_POINT_BUDGET', 'RENDER_WORKERS')},
+    }
+
+def run(names, repeat, out):
+
+    from dataset import Dataset
+    from synthetic import synthetic
+
+    results = {'repeat': repeat, 'datasets': {}, 'records': []}
+    work = tempfile.mkdtemp(prefix='bench_suite_')
+    try:
+        for name in names:
+            spec = DATASETS[name]
+            t = time.perf_counter()
+            df = synthetic(spec['scale'], spec['start_year'], END_YEAR)
+            generate_s = time.perf_counter() - t
+
+            # Leave out the change cube (one float32 per row per start year) where it would not fit.
+            cube = len(df) * (END_YEAR - spec['start_year'] + 1) * 4 <= CUBE_BYTES
+            bundle = os.path.join(work, name)
+            Dataset(df, cube=cube, version=name).save(bundle)
+            results['datasets'][name] = dict(spec, rows=len(df), series=int(df['Category'].nunique()), cube=cube, generate_s=round(generate_s, 2))
+            print('%s: %d rows, %d series, cube %s' % (name, len(df), results['datasets'][name]['series'], cube))
+            del df
+
+            # A fresh process per dataset, so one dataset's memory and caches do not affect the next.
+            part = os.path.join(work, name + '.json')
+            subprocess.run([sys.executable, __file__, '--child', bundle, name, str(spec['start_year']), str(repeat), part], check=True)
+            with open(part) as f:
+                child = json.load(f)
+            results['records'].extend(child['records'])
+            results.update(child['environment'])
+            for r in child['records']:
+                if 'error' in r:
+                    print('  %s failed: %s' % (' '.join(str(r.get(k)) for k in ('selection', 'window', 'chart_type', 'step')), r['error'][:120]))
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=1)
+    print('wrote %d timings to %s' % (len(results['records']), out))
+
+def record_key(r):
+    return tuple(r.get(k) for k in ('dataset', 'selection', 'window', 'chart_type', 'step'))
+
+def compare(old_path, new_path, threshold):
+    '''
+    Prints the steps whose median changed by more than threshold percent. Returns how many got slower.
+    '''
+    with open(old_path) as f:
+        old = {record_key(r): r for r in json.load(f)['records'] if 'ms' in r}
+    with open(new_path) as f:
+        new = {record_key(r): r for r in json.load(f)['records'] if 'ms' in r}
+
+    slower = 0
+    print('%-12s %-11s %-7s %-10s %-11s %10s %10s %8s' % ('dataset', 'selection', 'window', 'chart', 'step', 'old ms', 'new ms', 'change'))
+    for key in sorted(set(old) & set(new), key=lambda k: tuple(str(v) for v in k)):
+        a, b = old[key]['ms']['median'], new[key]['ms']['median']
+        change = (b - a) / a * 100 if a else 0.0
+        if abs(change) > threshold:
+            slower += change > 0
+            print('%-12s %-11s %-7s %-10s %-11s %10.1f %10.1f %+7.0f%%' % (tuple(str(v or '') for v in key) + (a, b, change)))
+    missing = len(set(old) ^ set(new))
+    print('%d timings compared, %d slower by more than %g%%%s' % (
+        len(set(old) & set(new)), slower, threshold, ', %d only in one run' % missing if missing else ''))
+    return slower
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--datasets', default=','.join(DATASETS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--out', default=os.path.join(HERE, 'results', 'suite-%s.json' % time.strftime('%Y%m%d-%H%M%S')))
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('--threshold', type=float, default=20)
+    parser.add_argument('--child', nargs=5, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        bundle, name, start_year, repeat, part = args.child
+        records = run_child(bundle, name, int(start_year), int(repeat))
+        import flaskapp
+        with open(part, 'w') as f:
+            json.dump({'records': records, 'environment': environment(flaskapp.app.config)}, f)
+    elif args.compare:
+        sys.exit(1 if compare(args.compare[0], args.compare[1], args.threshold) else 0)
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        run(args.datasets.split(','), args.repeat, args.out)
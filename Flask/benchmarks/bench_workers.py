@@ -0,0 +1,79 @@
+'''
+Starts N app workers side by side and reports each one's memory, with the dataset
+held privately by every worker (pickle, INFLATION_VIZ_SHARED=0) against one
+memory-mapped copy shared by all of them (pickle converted once, or a bundle).
+
+    python benchmarks/bench_workers.py [path/to/combined_data.pkl] [--workers 4]
+
+USS is memory only that process holds (what killing it would free); PSS splits
+shared pages evenly between the processes mapping them, so the PSS column sums
+to what the workers cost together.
+'''
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(HERE, '..')
+
+# Each worker imports the app, renders a few charts, reports ready and waits.
+WORKER = '''
+import io, contextlib, sys, warnings
+warnings.filterwarnings('ignore')
+sys.path.insert(0, 'benchmarks')
+from queries import drill_down_parent
+with contextlib.redirect_stdout(io.StringIO()):
+    import flaskapp
+    c = flaskapp.app.test_client()
+    parent = drill_down_parent(flaskapp.datasets.current.tree)
+    for q in ['start_year=1970&end_year=2021', 'chart_type=Bar+Chart&start_year=1990&end_year=2021&earnings=By+Race',
+              'start_year=2000&end_year=2021&parent=' + parent, 'start_year=1980&end_year=2021&stocks=Include']:
+        c.get('/chart?' + q)
+print(flaskapp.datasets.current.version, flush=True)
+sys.stdin.readline()
+'''
+
+def memory(pid):
+    '''
+    Returns RSS, PSS and USS of a process in MB, from /proc/<pid>/smaps_rollup.
+    '''
+    fields = {}
+    with open('/proc/%d/smaps_rollup' % pid) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return fields['Rss'], fields['Pss'], fields['Private_Clean'] + fields['Private_Dirty']
+
+def run(label, data_path, n, **env):
+    env = dict(os.environ, INFLATION_VIZ_DATA=data_path, INFLATION_VIZ_RELOAD='0', **env)
+    procs = [subprocess.Popen([sys.executable, '-c', WORKER], cwd=APP_DIR, env=env, text=True,
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE) for _ in range(n)]
+    try:
+        versions = set(p.stdout.readline().strip() for p in procs)
+        stats = [memory(p.pid) for p in procs]
+    finally:
+        for p in procs:
+            p.communicate('\n')
+
+    for i, (rss, pss, uss) in enumerate(stats):
+        print('%-8s worker %d %10.1f %10.1f %10.1f' % (label, i, rss, pss, uss))
+    print('%-8s total    %10.1f %10.1f %10.1f   (%d version%s)\n' % (
+        label, sum(s[0] for s in stats), sum(s[1] for s in stats), sum(s[2] for s in stats),
+        len(versions), '' if len(versions) == 1 else 's'))
+
+def main(pickle_path, n):
+
+    cache = tempfile.mkdtemp()
+    print('%-8s %-8s %10s %10s %10s' % ('mode', '', 'RSS MB', 'PSS MB', 'USS MB'))
+    run('private', pickle_path, n, INFLATION_VIZ_SHARED='0')
+    run('shared', pickle_path, n, INFLATION_VIZ_SHARED='1', INFLATION_VIZ_CACHE=cache)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('pickle', nargs='?', default='/groups/inflation_viz/flaskapp/combined_data.pkl')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    main(args.pickle, args.workers)
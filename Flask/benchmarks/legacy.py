@@ -0,0 +1,94 @@
+'''
+Reference copy of the original data_parse, which works on a deep copy of the
+full combined frame. Used by the benchmarks to compare against the current path.
+'''
+import pandas as pd
+import numpy as np
+
+def build_arg_text(**args):
+    
+    arg_text = '?chart_type=' + args.get('chart_type','Line+Chart')
+    arg_text += '&start_year=' + args.get('start_year','2000')
+    arg_text += '&end_year=' + args.get('end_year','2021')
+    arg_text += '&inflation=' + args.get('inflation','By+Category')
+    arg_text += '&earnings=' + args.get('earnings','Exclude')
+    arg_text += '&unemployment=' + args.get('unemployment','Exclude')
+    arg_text += '&stocks=' + args.get('stocks','Exclude')
+    
+    return arg_text
+
+def legacy_data_parse(df, **args):
+    
+    website = 'https://apps-summer22.ischool.berkeley.edu/inflation_viz/chart'
+    arg_text = website + build_arg_text(**args)
+    
+    start_date = '1/1/' + str(args.get('start_year','2000'))
+    end_date = '12/1/' + str(args.get('end_year','2021'))
+    start_year = int(args.get('start_year',2000))
+    end_year = int(args.get('end_year',2021))
+
+    # Start off with no hyperlinks and add where needed.
+    df['href'] = arg_text
+    
+    # CPI
+    df_cpi = pd.DataFrame(columns=['date','change','Category','href'])
+    if args.get('parent','') == '':
+        if args.get('inflation','By Category') == 'Exclude':
+            df_cpi = pd.DataFrame(columns=['date','change','Category','href'])
+        elif args.get('inflation','By Category') == 'By Category':
+            df_cpi = df[df['Parent Series ID'] == 'CUSR0000SA0']
+        elif args.get('inflation','By Category') == 'Total':
+            df_cpi = df[df['series'] == 'CUSR0000SA0']
+    else:
+        df_cpi = df[df['Parent Series ID'] == args.get('parent','')]
+        
+    if args.get('inflation','By Category') != 'Exclude':
+        #df_cpi['Category'] = 'CPI - ' + df_cpi['Category']
+        df_cpi['href'] = np.where(df_cpi['Leaf'] == 0, arg_text + '&parent=' + df_cpi['series'], arg_text)
+        
+    # Earnings
+    if args.get('earnings','') in ['','Exclude']:
+        df_earnings = pd.DataFrame()
+    else:
+        df_earnings = df[(df['Type'] == 'Earnings') & (df['Bucket'] == args.get('earnings','').replace('+',' '))]
+        
+    # Unemployment
+    if args.get('unemployment','') in ['','Exclude']:
+        df_unemployment = pd.DataFrame()
+    else:
+        df_unemployment = df[(df['Type'] == 'Unemployment') & (df['Bucket'] == args.get('unemployment','').replace('+',' '))]
+        
+    # Stocks
+    if args.get('stocks','') in ['','Exclude']:
+        df_stocks = pd.DataFrame()
+    else:
+        df_stocks = df[df['Type'] == 'Stocks'] 
+
+    # Combine selected data.
+    df = pd.concat([df_cpi, df_earnings, df_unemployment, df_stocks])
+
+    # Skip remaining steps if df is empty.
+    if len(df) == 0:
+        return df
+
+    # Normalize values to % change in the specific category from start of date window.
+    baseline_dict, ac_dict = {}, {}
+    series_start_dt = df[['date','value','Category']].groupby('Category').date.min().to_dict()
+    min_dt = df[df['date'] >= start_date][['date','value','Category']].groupby('Category').date.min().to_dict()
+    for k,v in min_dt.items():
+        baseline_dict[k] = df[(df['Category'] == k) & (df['date'] == v)].value.item()
+    df['baseline'] = df['Category'].map(baseline_dict) 
+    df['change'] = df['value']/df['baseline'] - 1
+    df['baseline_year'] = df['Category'].map(series_start_dt).dt.year
+    df['partial_data'] = np.where(df['baseline_year'] > int(args.get('start_year','2000')), "Since " + df['baseline_year'].astype(str), "")
+
+    # Looking up anual change
+    cat_list = df['Category'].to_list()
+    date_list = df['date'].to_list()
+    val_list = df['value'].to_list()
+    val_lookup = dict(zip(zip(cat_list,date_list), val_list))
+    df['past_key']  = list(zip(df['Category'], df['date'] - pd.offsets.DateOffset(years=1)))
+    df['past_val'] = df['past_key'].map(val_lookup)
+    df['yoy_change'] = df['value'] / df['past_val'] - 1
+
+    return df
@@ -0,0 +1,154 @@
+'''
+Load test of /chart under a mix of heavy and light queries, comparing:
+
+    sync     one request at a time, rendering inline (a sync worker)
+    threads  threaded server, rendering in the request thread
+    pool     threaded server, rendering in a pool of worker processes
+
+    python benchmarks/load_render.py [path/to/combined_data.pkl] [--seconds 20] [--clients 8] [--workers 2]
+
+Light requests are charts already in the cache. Heavy requests are uncached
+renders: "unique" ones with random year ranges, and "hot" ones, a few popular
+charts whose cache entries are dropped every couple of seconds (as after a data
+reload), so identical renders arrive together. Reports latency percentiles per
+class, "busy" (503) answers, and how many renders the server actually ran.
+'''
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(HERE, '..')
+
+# Runs the app with two test-only routes: render counters, and dropping the hot charts from the cache.
+SERVER = '''
+import io, contextlib, json, signal, sys, warnings
+warnings.filterwarnings('ignore')
+from werkzeug.serving import make_server
+with contextlib.redirect_stdout(io.StringIO()):
+    import flaskapp
+
+@flaskapp.app.route('/_stats')
+def stats():
+    p = flaskapp.render_pool
+    return json.dumps({'submitted': p.submitted, 'joined': p.joined, 'rejected': p.rejected})
+
+@flaskapp.app.route('/_drop')
+def drop():
+    hot = set(tuple(flaskapp.canonical_args(dict(a.split('=') for a in q.split('&'))).values()) for q in json.loads(sys.argv[3]))
+    return str(flaskapp.chart_cache.discard(lambda key: key[2:] in hot))
+
+# Stop the render workers with the server, or they outlive it.
+signal.signal(signal.SIGTERM, lambda *_: (flaskapp.render_pool.shutdown(), sys.exit(0)))
+make_server('127.0.0.1', int(sys.argv[1]), flaskapp.app, threaded=sys.argv[2] == '1').serve_forever()
+'''
+
+LIGHT = ['chart_type=Bar+Chart&start_year=%d&end_year=2021' % y for y in range(1990, 2000)]
+HOT = ['start_year=1970&end_year=2021', 'start_year=1970&end_year=2021&earnings=By+Race&stocks=Include',
+       'start_year=1980&end_year=2021&unemployment=By+Education']
+
+def free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+def get(base, path, timeout=120):
+    t = time.perf_counter()
+    try:
+        with urllib.request.urlopen(base + path, timeout=timeout) as r:
+            r.read()
+            status = r.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - t
+
+def run(label, data_path, threaded, workers, seconds, clients):
+    port = free_port()
+    base = 'http://127.0.0.1:%d' % port
+    env = dict(os.environ, INFLATION_VIZ_DATA=data_path, INFLATION_VIZ_RELOAD='0', INFLATION_VIZ_RENDER_WORKERS=str(workers))
+    server = subprocess.Popen([sys.executable, '-c', SERVER, str(port), '1' if threaded else '0', json.dumps(HOT)],
+                              cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(600):
+            try:
+                get(base, '/_stats', timeout=1)
+                break
+            except OSError:
+                time.sleep(0.1)
+
+        # Warm the cache for the light queries and start any render workers.
+        for q in LIGHT + HOT:
+            get(base, '/chart?' + q)
+        before = json.loads(urllib.request.urlopen(base + '/_stats').read())
+
+        stop = time.monotonic() + seconds
+        results = {'light': [], 'hot': [], 'unique': []}
+        busy = {'light': 0, 'hot': 0, 'unique': 0}
+        lock = threading.Lock()
+
+        def client(seed):
+            rng = random.Random(seed)
+            while time.monotonic() < stop:
+                r = rng.random()
+                if r < 0.6:
+                    kind, q = 'light', rng.choice(LIGHT)
+                elif r < 0.8:
+                    kind, q = 'hot', rng.choice(HOT)
+                else:
+                    kind, q = 'unique', 'start_year=%d&end_year=%d&earnings=By+Race' % (rng.randint(1970, 1999), rng.randint(2000, 2021))
+                status, dt = get(base, '/chart?' + q)
+                with lock:
+                    if status == 503:
+                        busy[kind] += 1
+                    else:
+                        results[kind].append(dt)
+
+        def dropper():
+            while time.monotonic() < stop:
+                time.sleep(2)
+                get(base, '/_drop')
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)] + [threading.Thread(target=dropper)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        after = json.loads(urllib.request.urlopen(base + '/_stats').read())
+    finally:
+        server.terminate()
+        server.wait()
+
+    for kind in ['light', 'hot', 'unique']:
+        lat = np.array(results[kind]) * 1e3 if results[kind] else np.array([np.nan])
+        print('%-8s %-7s %6d %6d %9.0f %9.0f %9.0f %9.0f' % (label, kind, len(results[kind]), busy[kind],
+              np.percentile(lat, 50), np.percentile(lat, 95), np.percentile(lat, 99), np.max(lat)))
+    print('%-8s renders run %d, joined in-flight %d, rejected busy %d\n' % (
+        label, after['submitted'] - before['submitted'], after['joined'] - before['joined'], after['rejected'] - before['rejected']))
+
+def main(data_path, seconds, clients, workers):
+    print('%d CPU(s)' % os.cpu_count())
+    print('%-8s %-7s %6s %6s %9s %9s %9s %9s' % ('server', 'class', 'ok', 'busy', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms'))
+    run('sync', data_path, False, 0, seconds, clients)
+    run('threads', data_path, True, 0, seconds, clients)
+    run('pool', data_path, True, workers, seconds, clients)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('pickle', nargs='?', default='/groups/inflation_viz/flaskapp/combined_data.pkl')
+    parser.add_argument('--seconds', type=int, default=20)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+    main(args.pickle, args.seconds, args.clients, args.workers)
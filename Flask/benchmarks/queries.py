@@ -0,0 +1,36 @@
+'''
+Charts the benchmarks request, with series taken from the dataset's category tree
+so the same queries work on the BLS data and on synthetic datasets.
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from category_tree import ROOT
+
+def drill_down_parent(tree, depth=2):
+    '''
+    A CPI group `depth` levels below the root that has categories of its own (Food
+    at home in the BLS data), found by following the first such child down.
+    '''
+    names = tree.meta['series'].values
+    series = ROOT
+    for _ in range(depth):
+        groups = [names[p] for p in tree.children(series) if tree.children(names[p])]
+        if not groups:
+            break
+        series = groups[0]
+    return series
+
+def chart_queries(tree):
+    '''
+    /chart query strings by name: the default chart, a drill-down into
+    drill_down_parent's group, a bar chart and one with every kind of series.
+    '''
+    return {
+        'default_line': 'chart_type=Line+Chart',
+        'drill_down_group': 'chart_type=Line+Chart&start_year=1970&end_year=2021&parent=' + drill_down_parent(tree),
+        'bar_1970_2021': 'chart_type=Bar+Chart&start_year=1970&end_year=2021',
+        'everything_1970_2021': 'chart_type=Line+Chart&start_year=1970&end_year=2021&earnings=By+Race&unemployment=By+Education&stocks=Include',
+    }
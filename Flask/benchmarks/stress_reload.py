@@ -0,0 +1,151 @@
+'''
+Renders charts continuously from several threads while the dataset bundle the app
+serves is rewritten underneath it, alternating between two versions of the data.
+
+    python benchmarks/stress_reload.py [path/to/combined_data.pkl] [--seconds 20] [--threads 8] [--period 0.5]
+
+Every response must be a 200 whose body is exactly what its X-Dataset-Version
+header's dataset renders, and every /data request pinned to the version of the
+chart that linked it must be served from that version. Exits non-zero otherwise.
+'''
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+warnings.filterwarnings('ignore')
+
+from dataset import Dataset
+from queries import drill_down_parent
+from schema import compact
+
+def queries(tree):
+    return [
+        'chart_type=Line+Chart&start_year=2000&end_year=2021',
+        'chart_type=Line+Chart&start_year=1970&end_year=2021&parent=' + drill_down_parent(tree),
+        'chart_type=Bar+Chart&start_year=1985&end_year=2021&earnings=Total',
+        'chart_type=Bar+Chart&start_year=2010&end_year=2020&inflation=Total&stocks=Include',
+        'chart_type=Line+Chart&start_year=2015&end_year=2021&unemployment=By+Education',
+    ]
+
+def chart_datasets(html):
+    '''
+    The inline rows of a rendered chart, by dataset name. Equal data gives equal
+    dicts even though other parts of the HTML vary between renders.
+    '''
+    return json.loads(re.search(r'var spec = (\{.*?\});\n', html, re.S).group(1)).get('datasets')
+
+def main(pickle_path, seconds, threads, period):
+
+    # Two versions of the same data: the original and every value shifted by one,
+    # which changes every computed change and so every chart.
+    df = compact(pd.read_pickle(pickle_path))
+    shifted = df.assign(value=df['value'] + np.float32(1))
+    versions = [Dataset(df), Dataset(shifted)]
+    QUERIES = queries(versions[0].tree)
+
+    live = tempfile.mkdtemp()
+    versions[0].save(live)
+    os.environ['INFLATION_VIZ_DATA'] = live
+    os.environ['INFLATION_VIZ_RELOAD'] = '0.05'
+    with contextlib.redirect_stdout(io.StringIO()):
+        import flaskapp
+        from chart_cache import canonical_args
+
+    # What each version should render, computed directly from bundles of each.
+    expected = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for ds in versions:
+            path = tempfile.mkdtemp()
+            ds.save(path)
+            loaded = Dataset.load(path)
+            for q in QUERIES:
+                args = canonical_args(dict(p.split('=') for p in q.split('&')))
+                expected[loaded.version, 'chart', q] = chart_datasets(flaskapp.render_chart(loaded, **args))
+                expected[loaded.version, 'data', q] = flaskapp.columnar_json(flaskapp.chart_data(loaded, **args)).encode('utf-8')
+    known = set(v for v, _, _ in expected)
+    print('versions %s' % sorted(known))
+
+    stop = time.monotonic() + seconds
+    lock = threading.Lock()
+    stats = {'requests': 0, 'errors': [], 'latency': [], 'seen': set()}
+
+    def fail(message):
+        with lock:
+            stats['errors'].append(message)
+
+    def client():
+        c = flaskapp.app.test_client()
+        rng = random.Random(threading.get_ident())
+        while time.monotonic() < stop:
+            q = rng.choice(QUERIES)
+            t = time.perf_counter()
+            r = c.get('/chart?' + q)
+            version = r.headers.get('X-Dataset-Version')
+            if r.status_code != 200 or version not in known:
+                fail('/chart %s: %s %s' % (q, r.status_code, version))
+                continue
+            if chart_datasets(r.get_data(as_text=True)) != expected[version, 'chart', q]:
+                fail('/chart %s: body does not match version %s' % (q, version))
+
+            # Fetch the same chart's rows pinned to the version it was drawn from, as a page in 'url' mode would.
+            d = c.get('/data?' + q + '&v=' + version)
+            if d.status_code != 200 or d.headers.get('X-Dataset-Version') != version:
+                fail('/data %s: %s, wanted version %s got %s' % (q, d.status_code, version, d.headers.get('X-Dataset-Version')))
+            elif d.data != expected[version, 'data', q]:
+                fail('/data %s: body does not match version %s' % (q, version))
+
+            with lock:
+                stats['requests'] += 2
+                stats['latency'].append(time.perf_counter() - t)
+                stats['seen'].add(version)
+
+    def writer():
+        i = 0
+        while time.monotonic() < stop:
+            time.sleep(period)
+            i += 1
+            versions[i % 2].save(live)
+        stats['saves'] = i
+
+    # Loads that race with a rewrite are expected to fail here; keep their warnings out of the report.
+    logging.getLogger('inflation_viz').setLevel(logging.ERROR)
+    workers = [threading.Thread(target=client) for _ in range(threads)] + [threading.Thread(target=writer)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    lat = np.array(stats['latency']) * 1e3
+    print('%d requests in %ds from %d threads; %d saves, %d reloads, %d failed loads, versions served %d' % (
+        stats['requests'], seconds, threads, stats['saves'], flaskapp.datasets.reloads,
+        flaskapp.datasets.errors, len(stats['seen'])))
+    print('chart+data round trip ms: p50 %.1f  p99 %.1f  max %.1f' % (np.percentile(lat, 50), np.percentile(lat, 99), lat.max()))
+    print('cache: %d entries, %d hits, %d misses' % (len(flaskapp.chart_cache), flaskapp.chart_cache.hits, flaskapp.chart_cache.misses))
+    for e in stats['errors'][:10]:
+        print('ERROR ' + e)
+    print('%d errors' % len(stats['errors']))
+
+    return 1 if stats['errors'] or flaskapp.datasets.reloads == 0 else 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('pickle', nargs='?', default='/groups/inflation_viz/flaskapp/combined_data.pkl')
+    parser.add_argument('--seconds', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--period', type=float, default=0.5, help='Seconds between rewrites of the bundle.')
+    args = parser.parse_args()
+    sys.exit(main(args.pickle, args.seconds, args.threads, args.period))
@@ -0,0 +1,158 @@
+'''
+Synthetic combined datasets in the compact schema (schema.SCHEMA), shaped like
+combined_data.pkl: a CPI category tree under CUSR0000SA0, quarterly earnings and
+monthly unemployment series in the same buckets as the BLS data, and three stock
+indexes. Values are random walks, so charts have realistic shapes.
+
+    python benchmarks/synthetic.py out.pkl [--scale 10] [--start-year 1970] [--end-year 2022]
+
+scale roughly multiplies the number of CPI series (spread over every level of
+the tree) and the start and end years set the history length.
+'''
+import argparse
+import calendar
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from category_tree import ROOT
+from schema import SCHEMA, compact
+
+# Children per CPI series at levels 1-3 for scale 1: 8 groups, 32 categories, 128 items.
+FANOUT = (8, 4, 4)
+
+BUCKETS = {
+    'Total': ['All'],
+    'By Gender': ['Men', 'Women'],
+    'By Race': ['White People', 'Black People', 'Asian People', 'Hispanic People'],
+    'By Race and Gender': ['White Men', 'White Women', 'Black Men', 'Black Women', 'Hispanic Men', 'Hispanic Women'],
+    'By Education': ['H.S. Unfinished', 'H.S. Finished', 'Some College', 'Bachelors', 'Advanced Degree'],
+}
+
+STOCKS = ['S - Dow', 'S - NASDAQ', 'S - S&P']
+
+def series_id(i):
+    '''
+    The series ID of the i-th synthetic CPI series; series 0 is the root.
+    '''
+    return ROOT if i == 0 else 'CUSR0000S%06d' % i
+
+def cpi_tree(scale=1):
+    '''
+    One row per CPI series, root first and then level by level: series ID, parent
+    series ID, level and whether it is a leaf. scale multiplies the fanout of every
+    level by the cube root of itself, so the tree keeps its depth.
+    '''
+    fanout = [max(int(round(f * scale ** (1 / 3.0))), 1) for f in FANOUT]
+    rows = [(series_id(0), None, 0)]
+    level = [0]
+    for depth, f in enumerate(fanout, 1):
+        below = []
+        for parent in level:
+            for _ in range(f):
+                below.append(len(rows))
+                rows.append((series_id(len(rows)), series_id(parent), depth))
+        level = below
+    tree = pd.DataFrame(rows, columns=['series', 'Parent Series ID', 'Level'])
+    tree['Leaf'] = (tree['Level'] == len(fanout)).astype(float)
+    tree['Category'] = ['CPI - All items'] + ['CPI - Item %d' % i for i in range(1, len(tree))]
+    return tree
+
+def observations(starts, end_month, step, rng):
+    '''
+    Month indexes and random-walk values for series starting at the given month
+    indexes, every `step` months up to end_month. Returns (series position, month, value).
+    '''
+    counts = np.maximum((end_month - starts) // step + 1, 0)
+    which = np.repeat(np.arange(len(starts)), counts)
+    offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    months = np.repeat(starts, counts) + offset * step
+
+    # Cumulative growth per series: sum the steps, then subtract the total of the series before.
+    steps = rng.normal(0.003 * step, 0.01 * np.sqrt(step), len(months))
+    walk = np.cumsum(steps)
+    walk -= np.repeat(np.concatenate([[0], walk[np.cumsum(counts)[:-1] - 1]]), counts)
+    return which, months, 100 * np.exp(walk)
+
+def synthetic(scale=1, start_year=1970, end_year=2022, seed=0):
+    '''
+    A synthetic combined dataset in the compact schema, ending in June of end_year
+    like the BLS pull it imitates. Series start in start_year or, for some CPI
+    series, a few decades later; earnings start no earlier than 1979.
+    '''
+    rng = np.random.default_rng(seed)
+    end_month = end_year * 12 + 5
+    span = end_year - start_year
+
+    # CPI: most series cover the whole history, some start later.
+    tree = cpi_tree(scale)
+    tree['Type'] = None
+    tree['Bucket'] = None
+    late = rng.choice([0, 0, 0, span // 6, span * 2 // 5, span * 11 // 20], len(tree))
+    late[0] = 0
+    tree['start'] = (start_year + late) * 12
+
+    # Earnings (quarterly, from 1979) and unemployment (monthly) in every demographic bucket.
+    other = []
+    for kind, prefix, first in [('Earnings', 'E', max(start_year, 1979)), ('Unemployment', 'U', start_year)]:
+        for bucket, groups in BUCKETS.items():
+            for group in groups:
+                other.append(('%s - %s' % (prefix, group), kind, bucket, first * 12 + (2 if kind == 'Earnings' else 0)))
+    other = pd.DataFrame(other, columns=['Category', 'Type', 'Bucket', 'start'])
+    other['series'] = ['LNU0%07d' % i for i in range(len(other))]
+
+    stocks = pd.DataFrame({'Category': STOCKS, 'Type': 'Stocks', 'Bucket': None, 'start': start_year * 12})
+
+    series = pd.concat([tree, other, stocks], ignore_index=True)
+    step = np.where(series['Type'] == 'Earnings', 3, 1)
+
+    # Generate each step size separately so quarterly series stay on quarter ends.
+    parts = []
+    for s in np.unique(step):
+        rows = np.flatnonzero(step == s)
+        which, months, values = observations(series['start'].values[rows], end_month, s, rng)
+        parts.append((rows[which], months, values))
+    which = np.concatenate([p[0] for p in parts])
+    months = np.concatenate([p[1] for p in parts])
+    values = np.concatenate([p[2] for p in parts])
+    order = np.lexsort((months, which))
+    which, months, values = which[order], months[order], values[order]
+
+    # Stocks have no BLS period or series ID.
+    is_stock = (series['Type'] == 'Stocks').values[which]
+    month_of_year = np.where(is_stock, -1, months % 12)
+    none = np.full(len(months), -1)
+
+    df = pd.DataFrame({
+        'series': pd.Categorical(series['series'].values[which]),
+        'Category': pd.Categorical(series['Category'].values[which]),
+        'Parent Series ID': pd.Categorical(series['Parent Series ID'].values[which]),
+        'Level': series['Level'].values[which],
+        'Leaf': series['Leaf'].values[which],
+        'Type': pd.Categorical(series['Type'].values[which]),
+        'Bucket': pd.Categorical(series['Bucket'].values[which]),
+        'year': months // 12,
+        'period': pd.Categorical.from_codes(month_of_year, ['M%02d' % m for m in range(1, 13)]),
+        'periodName': pd.Categorical.from_codes(month_of_year, list(calendar.month_name[1:])),
+        'latest': pd.Categorical.from_codes(none, []),
+        'footnotes': pd.Categorical.from_codes(none + 1, ['']),
+        'month': months,
+        'value': values,
+    })
+    return compact(df)[list(SCHEMA)]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('out')
+    parser.add_argument('--scale', type=float, default=1)
+    parser.add_argument('--start-year', type=int, default=1970)
+    parser.add_argument('--end-year', type=int, default=2022)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    df = synthetic(args.scale, args.start_year, args.end_year, args.seed)
+    df.to_pickle(args.out)
+    print('%d rows, %d series -> %s' % (len(df), df['Category'].nunique(), args.out))
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+ROOT = 'CUSR0000SA0' # All items CPI, the top of the category tree.
+
+class CategoryTree(object):
+    '''
+    Index of the CPI category tree (series -> parent, from the Parent Series ID column
+    of CPI_Category_Tree_Final) over a Dataset's series metadata.
+
+    Every lookup returns positions into meta, in meta order, so selecting children,
+    leaves or ancestors only touches those series and never scans the observations.
+    Each position's row range in the dataset arrays is meta.start:meta.stop.
+    '''
+
+    def __init__(self, meta):
+        self.meta = meta
+        series = meta['series'].values
+        parents = meta['Parent Series ID'].values
+
+        # Series ID -> position in meta. Stocks have no series ID and are left out.
+        self.pos = {s: i for i, s in enumerate(series) if isinstance(s, str)}
+        self.parent = {s: p for s, p in zip(series, parents) if isinstance(s, str) and isinstance(p, str)}
+
+        # Parent series ID -> positions of its children, in meta order.
+        self.children_of = {}
+        for i, p in enumerate(parents):
+            if isinstance(p, str):
+                self.children_of.setdefault(p, []).append(i)
+
+        # Number the tree depth-first so the descendants of a series are one
+        # contiguous run of self.order: order[first[s]:last[s]].
+        self.order = []
+        self.first = {}
+        self.last = {}
+        self.depth = np.zeros(len(meta), dtype=np.int64)
+        roots = [s for s in self.pos if s not in self.parent or self.parent[s] not in self.pos]
+        for root in roots:
+            stack = [(root, 0, False)]
+            while stack:
+                s, depth, done = stack.pop()
+                if done:
+                    self.last[s] = len(self.order)
+                    continue
+                self.first[s] = len(self.order)
+                self.order.append(self.pos[s])
+                self.depth[self.pos[s]] = depth
+                stack.append((s, depth, True))
+                for i in reversed(self.children_of.get(s, [])):
+                    stack.append((series[i], depth + 1, False))
+        self.order = np.array(self.order, dtype=np.int64)
+
+        # Leaf flags, falling back to "has no children" where the spreadsheet left Leaf blank.
+        leaf = pd.to_numeric(meta['Leaf'], errors='coerce').values
+        self.is_leaf = np.array([leaf[i] == 1 if not np.isnan(leaf[i]) else s not in self.children_of
+                                 for i, s in enumerate(series)], dtype=bool)
+
+    def __contains__(self, series):
+        return series in self.pos
+
+    def children(self, series):
+        '''
+        Positions of the direct children of series.
+        '''
+        return list(self.children_of.get(series, []))
+
+    def descendants(self, series, depth=None):
+        '''
+        Positions of everything below series, depth-first. depth limits how many
+        levels down to go (1 is the same as children()).
+        '''
+        if series not in self.first:
+            return []
+        below = self.order[self.first[series] + 1:self.last[series]]
+        if depth is not None:
+            below = below[self.depth[below] <= self.depth[self.pos[series]] + depth]
+        return below.tolist()
+
+    def leaves(self, series):
+        '''
+        Positions of the leaf categories under series, e.g. every item under Food.
+        '''
+        below = np.array(self.descendants(series), dtype=np.int64)
+        return below[self.is_leaf[below]].tolist()
+
+    def ancestors(self, series):
+        '''
+        Positions of the parents of series, from the root down to its direct parent.
+        '''
+        chain = []
+        while series in self.parent and self.parent[series] in self.pos:
+            series = self.parent[series]
+            chain.append(self.pos[series])
+        return chain[::-1]
+
+    def breadcrumbs(self, series):
+        '''
+        (series ID, Category) pairs from the root down to series itself.
+        '''
+        if series not in self.pos:
+            return []
+        path = self.ancestors(series) + [self.pos[series]]
+        return list(zip(self.meta['series'].values[path], self.meta.index.values[path]))
+
+    def select(self, positions):
+        '''
+        The slice of meta for positions, ready to pass to Dataset.frame().
+        '''
+        return self.meta.iloc[positions]
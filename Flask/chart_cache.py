@@ -0,0 +1,101 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Query args that determine a chart, with the defaults chart_render applies when one is missing.
+CHART_ARGS = [
+    ('chart_type', 'Line Chart'),
+    ('start_year', '2000'),
+    ('end_year', '2021'),
+    ('inflation', 'By Category'),
+    ('earnings', 'Exclude'),
+    ('unemployment', 'Exclude'),
+    ('stocks', 'Exclude'),
+    ('parent', ''),
+    ('expand', ''), # 'Leaves' shows every leaf category under parent instead of its children.
+]
+
+def canonical_args(args):
+    '''
+    Returns a dict holding every chart arg in one canonical spelling, so that
+    "By+Category" and "By Category", or an omitted arg and its explicit default,
+    describe the same chart. Unrecognized args are dropped.
+    '''
+    canon = {}
+    for name, default in CHART_ARGS:
+        value = str(args.get(name, default)).replace('+', ' ').strip()
+        if name in ('start_year', 'end_year') and value.lstrip('-').isdigit():
+            value = str(int(value))
+        canon[name] = value
+
+    return canon
+
+def cache_key(version, args):
+    '''
+    Returns the cache key for canonical args rendered against a dataset version.
+    '''
+    return (version,) + tuple(args[name] for name, _ in CHART_ARGS)
+
+def chart_etag(key):
+    '''
+    Returns an ETag for a cache key. Altair numbers selections per process, so
+    equal keys give equivalent rather than byte-identical HTML; send it as a weak tag.
+    '''
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:20]
+
+class ChartCache(object):
+    '''
+    Thread-safe LRU cache of rendered chart HTML (as bytes), bounded by total size.
+    '''
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._items:
+                self.bytes -= len(self._items.pop(key))
+            self._items[key] = value
+            self.bytes += size
+
+            # Evict least recently used entries until back under budget.
+            while self.bytes > self.max_bytes:
+                _, old = self._items.popitem(last=False)
+                self.bytes -= len(old)
+
+    def discard(self, predicate):
+        '''
+        Removes every entry whose key satisfies predicate. Returns how many were removed.
+        '''
+        with self._lock:
+            keys = [k for k in self._items if predicate(k)]
+            for k in keys:
+                self.bytes -= len(self._items.pop(k))
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
@@ -0,0 +1,64 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from dataset import month_index
+
+def to_columnar(df):
+    '''
+    Encodes a chart's data as one JSON object of equal-length column arrays.
+
+    Dates are sent as integer month indexes and text columns as codes into a
+    per-column list of distinct values (stored under "_<column>"), so repeated
+    strings such as category names and links are only sent once.
+    '''
+    payload = {}
+    for col in df.columns:
+        values = df[col].values
+        if np.issubdtype(values.dtype, np.datetime64):
+            payload[col] = month_index(values).tolist()
+        elif values.dtype.kind in 'fc':
+            payload[col] = np.where(np.isnan(values), None, values).tolist()
+        elif values.dtype.kind in 'iub':
+            payload[col] = values.tolist()
+        else:
+            codes, uniques = pd.factorize(values)
+            payload[col] = codes.tolist()
+            payload['_' + col] = [None if pd.isna(u) else str(u) for u in uniques]
+
+    return [payload]
+
+def columnar_json(df):
+    return json.dumps(to_columnar(df), separators=(',', ':'))
+
+def columnar_transforms(df):
+    '''
+    Returns the Vega-Lite transforms that turn a to_columnar payload back into
+    one row per observation with the original column names and values.
+    '''
+    import altair as alt
+
+    transforms = [alt.FlattenTransform(flatten=list(df.columns))]
+    for col in df.columns:
+        values = df[col].values
+        if np.issubdtype(values.dtype, np.datetime64):
+            # Months since year 0, rebuilt as local-time dates like Altair's inline data.
+            expr = 'datetime(floor(datum["%s"] / 12), datum["%s"] %% 12, 1)' % (col, col)
+        elif values.dtype.kind in 'fciub':
+            continue
+        else:
+            expr = 'datum["_%s"][datum["%s"]]' % (col, col)
+        transforms.append(alt.CalculateTransform(calculate=expr, **{'as': col}))
+
+    return transforms
+
+def url_chart(url, df):
+    '''
+    Returns an Altair chart that loads its data from url, served as to_columnar(df).
+    '''
+    import altair as alt
+
+    # Turn off type inference so arrays are not parsed as dates before they are flattened.
+    data = alt.UrlData(url=url, format=alt.DataFormat(type='json', parse=None))
+    return alt.Chart(data, transform=columnar_transforms(df))
@@ -0,0 +1,62 @@
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content codings the app can send, most preferred first. Brotli is optional.
+ENCODINGS = (['br'] if brotli is not None else []) + ['gzip']
+
+# Bodies smaller than this are sent as they are; compressing them saves next to nothing.
+MIN_SIZE = 1024
+
+# Compression levels: static pages are compressed once, so they get the smallest
+# output; charts are compressed on their first request, so speed matters too.
+LEVELS = {
+    'static': {'gzip': 9, 'br': 11},
+    'dynamic': {'gzip': 6, 'br': 5},
+}
+
+def compress(body, encoding, kind='dynamic'):
+    '''
+    Returns body (bytes) compressed with encoding, 'gzip' or 'br'. gzip output has no
+    timestamp, so equal bodies compress to equal bytes.
+    '''
+    level = LEVELS[kind][encoding]
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+def negotiate(accept_encodings, size=MIN_SIZE):
+    '''
+    Picks the coding for a body of `size` bytes from a request's Accept-Encoding
+    (werkzeug's request.accept_encodings): the client's favourite of ENCODINGS,
+    or 'identity' for no compression.
+    '''
+    if size < MIN_SIZE:
+        return 'identity'
+    return accept_encodings.best_match(ENCODINGS + ['identity'], default='identity')
+
+class StaticPage(object):
+    '''
+    A page's HTML, encoded and compressed in every coding of ENCODINGS once, with a
+    strong ETag per coding (a strong tag names exact bytes).
+    '''
+
+    def __init__(self, html):
+        body = html.encode('utf-8')
+        tag = hashlib.sha1(body).hexdigest()[:20]
+        self.bodies = {'identity': body}
+        self.etags = {'identity': tag}
+        for encoding in ENCODINGS:
+            self.bodies[encoding] = compress(body, encoding, 'static')
+            self.etags[encoding] = '%s-%s' % (tag, encoding)
+
+    def choose(self, accept_encodings):
+        '''
+        Returns the coding, body and ETag to answer a request with.
+        '''
+        encoding = negotiate(accept_encodings, len(self.bodies['identity']))
+        return encoding, self.bodies[encoding], self.etags[encoding]
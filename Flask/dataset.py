@@ -0,0 +1,319 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from category_tree import CategoryTree
+from schema import compact, validate
+
+# Per-series metadata carried over from the category tree and other BLS tables.
+META_COLS = ['series', 'Parent Series ID', 'Level', 'Leaf', 'Type', 'Bucket']
+
+# Files in a dataset bundle written by Dataset.save().
+MANIFEST = 'manifest.json'
+BUNDLE_ARRAYS = ['dates', 'months', 'values', 'codes', 'yoy', 'change_cube']
+
+def month_index(dates):
+    '''
+    Converts datetime64 values to integer months since January of year 0.
+    '''
+    dates = np.asarray(dates, dtype='datetime64[M]')
+    return (dates.astype(np.int64) + 1970 * 12).astype(np.int32)
+
+def month_dates(months):
+    '''
+    Converts integer months since January of year 0 back to datetime64 values.
+    '''
+    return (np.asarray(months, dtype=np.int64) - 1970 * 12).astype('datetime64[M]').astype('datetime64[ns]')
+
+def lag_values(code, month, values, lag=12):
+    '''
+    Returns the value each series had lag months earlier, or NaN where that period is missing.
+
+    Rows must be sorted by code and month. Quarterly series are stored on M03/M06/M09/M12, so a
+    12 month lag lands on the same quarter of the prior year.
+    '''
+    key = code.astype(np.int64) * (1 << 20) + month
+    target = key - lag
+    pos = np.searchsorted(key, target)
+    pos = np.minimum(pos, len(key) - 1)
+    past = values[pos].astype(np.float64)
+    past[key[pos] != target] = np.nan
+    return past
+
+class Dataset(object):
+    '''
+    Read-only, array-backed copy of combined_data.pkl.
+
+    Observations are sorted by series and date and stored as contiguous NumPy
+    arrays, with float32 values as in the compact schema. Each series (keyed by its Category name) owns the row range
+    meta.start:meta.stop of those arrays, so selecting a series is a zero-copy
+    slice. Build it once at import and share it across requests.
+
+    Because the data only changes between pulls, the cumulative change from
+    every start year in cube_years is precomputed into change_cube (one float32
+    row per start year, aligned with values), with annual change in yoy.
+    '''
+
+    @classmethod
+    def from_pickle(cls, path, **kwargs):
+        '''
+        Loads a pickled combined frame, versioned by the file's size and modification time.
+        Older pickles (with a date column rather than month) are converted to the compact
+        schema; a compact pickle that drifts from it raises ValueError.
+        '''
+        stat = os.stat(path)
+        version = '%x-%x' % (stat.st_mtime_ns, stat.st_size)
+        modified = datetime.fromtimestamp(int(stat.st_mtime), timezone.utc)
+        df = pd.read_pickle(path)
+        df = validate(df if 'month' in df.columns else compact(df))
+        return cls(df, version=version, modified=modified, **kwargs)
+
+    @classmethod
+    def shared(cls, path, cache_dir):
+        '''
+        Loads a pickle through a memory-mapped bundle in cache_dir, so that every process
+        serving the same pickle maps one copy of the arrays instead of building its own.
+        The first process to get the lock writes the bundle; the rest wait and map it.
+        Bundles for older versions of the pickle are removed, except the one before.
+        '''
+        import fcntl
+        import shutil
+
+        stat = os.stat(path)
+        prefix = os.path.splitext(os.path.basename(path))[0] + '-'
+        bundle = os.path.join(cache_dir, '%s%x-%x' % (prefix, stat.st_mtime_ns, stat.st_size))
+
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(os.path.join(cache_dir, prefix + 'lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.exists(os.path.join(bundle, MANIFEST)):
+                cls.from_pickle(path).save(bundle)
+
+                # Processes still mapping a removed bundle keep their pages until they reload.
+                older = sorted((d for d in os.listdir(cache_dir) if d.startswith(prefix) and d != prefix + 'lock'),
+                               key=lambda d: os.stat(os.path.join(cache_dir, d)).st_mtime_ns)
+                for d in older[:-2]:
+                    shutil.rmtree(os.path.join(cache_dir, d), ignore_errors=True)
+
+        return cls.load(bundle)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        '''
+        Loads a bundle written by save(). With mmap, arrays are mapped read-only from
+        disk, so start-up does no parsing and workers share the pages through the OS.
+        '''
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+
+        ds = cls.__new__(cls)
+        ds.version = manifest['version']
+        ds.modified = datetime.fromtimestamp(int(os.stat(os.path.join(path, MANIFEST)).st_mtime), timezone.utc)
+        files = manifest.get('files', {name: name + '.npy' for name in BUNDLE_ARRAYS})
+        for name in BUNDLE_ARRAYS:
+            setattr(ds, name, np.load(os.path.join(path, files[name]), mmap_mode='r' if mmap else None))
+        if any(len(getattr(ds, name)) != manifest['rows'] for name in ['dates', 'months', 'values', 'codes', 'yoy']):
+            raise ValueError('%s: arrays do not match the manifest (bundle is being rewritten?)' % path)
+        ds.cube_years = np.arange(manifest['cube_start'], manifest['cube_start'] + len(ds.change_cube))
+
+        # Series metadata doubles as the dictionary for the integer series codes.
+        meta = pd.DataFrame(manifest['series'], columns=['Category'] + META_COLS).set_index('Category')
+        ds._index(meta)
+        ds._key = ds.codes.astype(np.int64) * (1 << 20) + ds.months
+        ds._key.flags.writeable = False
+
+        return ds
+
+    def __init__(self, df, cube=True, version='0', modified=None):
+
+        # Identifies this copy of the data for caches and HTTP revalidation.
+        self.version = version
+        self.modified = modified
+
+        # Accept the compact schema (month index, categoricals) as well as the original one.
+        if 'month' not in df.columns:
+            df = df.assign(month=month_index(df['date'].values))
+        df = df.assign(**{c: df[c].astype(object) for c in ['Category'] + META_COLS if c in df.columns})
+
+        # Keep series in the order they appear in the source file.
+        order = pd.unique(df['Category'])
+        rank = pd.Series(np.arange(len(order)), index=order)
+        df = df.assign(_rank=df['Category'].map(rank).values).sort_values(['_rank', 'month'], kind='mergesort')
+
+        self.months = np.ascontiguousarray(df['month'].values, dtype=np.int32)
+        self.dates = month_dates(self.months)
+        self.values = np.ascontiguousarray(df['value'].values, dtype=np.float32)
+        self.codes = df['_rank'].values.astype(np.int32)
+        self._key = self.codes.astype(np.int64) * (1 << 20) + self.months
+
+        # One row per series with its metadata and row range.
+        self._index(df.drop_duplicates('Category').set_index('Category').reindex(columns=META_COLS))
+
+        # Derived change arrays.
+        self.yoy = (self.values / lag_values(self.codes, self.months, self.values, 12) - 1).astype(np.float32)
+        if cube:
+            self.cube_years = np.arange(self.months.min() // 12, self.months.max() // 12 + 1)
+        else:
+            self.cube_years = np.arange(0)
+        self.change_cube = np.empty((len(self.cube_years), len(self.values)), dtype=np.float32)
+        for i, year in enumerate(self.cube_years):
+            self.change_cube[i] = self._change(slice(None), year)
+
+        for arr in (self.dates, self.months, self.values, self.codes, self._key, self.yoy, self.change_cube):
+            arr.flags.writeable = False
+
+    def _index(self, meta):
+        counts = np.bincount(self.codes, minlength=len(meta))
+        meta['code'] = np.arange(len(meta))
+        meta['stop'] = np.cumsum(counts)
+        meta['start'] = meta['stop'] - counts
+        meta['first_date'] = self.dates[meta['start'].values]
+        meta['first_year'] = pd.DatetimeIndex(meta['first_date']).year
+        self.meta = meta
+        self.tree = CategoryTree(meta)
+
+    def checksum(self):
+        '''
+        Returns a SHA-1 of the observations and series metadata, independent of how they were loaded.
+        '''
+        h = hashlib.sha1()
+        for arr in (self.dates, self.values, self.codes):
+            h.update(np.ascontiguousarray(arr).tobytes())
+        h.update(self.meta.reset_index()[['Category'] + META_COLS].to_json(orient='values').encode('utf-8'))
+        return h.hexdigest()
+
+    def save(self, path):
+        '''
+        Writes the dataset as a directory of .npy arrays plus a JSON manifest holding
+        the version (a content checksum), the array file names, the series metadata,
+        and the first start year in the change cube.
+
+        Array files are named after the version and never overwritten, so saving over
+        a bundle that a running app has memory-mapped (or is loading) is safe: readers
+        only open the files their manifest names. Files from older saves are removed,
+        except those of the save just before this one.
+        '''
+        os.makedirs(path, exist_ok=True)
+        version = self.checksum()[:16]
+
+        files = {}
+        for name in BUNDLE_ARRAYS:
+            files[name] = '%s-%s.npy' % (name, version)
+            tmp = os.path.join(path, name + '.tmp.npy')
+            np.save(tmp, getattr(self, name))
+            os.replace(tmp, os.path.join(path, files[name]))
+
+        series = self.meta.reset_index()[['Category'] + META_COLS]
+        manifest = {
+            'version': version,
+            'rows': len(self),
+            'cube_start': int(self.cube_years[0]) if len(self.cube_years) else 0,
+            'files': files,
+            'series': json.loads(series.to_json(orient='values')),
+        }
+
+        try:
+            with open(os.path.join(path, MANIFEST)) as f:
+                previous = set(json.load(f).get('files', {}).values())
+        except (OSError, ValueError):
+            previous = set()
+
+        # Write the manifest last, so a reader never sees it before the arrays it describes.
+        tmp = os.path.join(path, MANIFEST + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, os.path.join(path, MANIFEST))
+
+        # Processes that still map a removed file keep reading it until they reload.
+        keep = previous | set(files.values())
+        for name in os.listdir(path):
+            if name.endswith('.npy') and name[:-4].split('-')[0] in BUNDLE_ARRAYS and name not in keep:
+                os.remove(os.path.join(path, name))
+
+    def __len__(self):
+        return len(self.values)
+
+    def series(self, category):
+        '''
+        Returns zero-copy (dates, values) views for a single series.
+        '''
+        start, stop = self.meta.loc[category, ['start', 'stop']]
+        return self.dates[start:stop], self.values[start:stop]
+
+    def grid(self):
+        '''
+        Returns (first_month, matrix): every series' values on one dense series x month
+        float64 grid whose first column is first_month (months since year 0), NaN where
+        a series has no observation. Rows are meta positions. Built on first use.
+        '''
+        grid = getattr(self, '_grid', None)
+        if grid is None:
+            first = int(self.months.min())
+            matrix = np.full((len(self.meta), int(self.months.max()) - first + 1), np.nan)
+            matrix[self.codes, self.months - first] = self.values
+            matrix.flags.writeable = False
+            grid = self._grid = (first, matrix)
+        return grid
+
+    def baselines(self, start_year):
+        '''
+        Returns each series' first value on or after January of start_year, or NaN if it has none.
+        '''
+        code = self.meta['code'].values
+        pos = np.searchsorted(self._key, code.astype(np.int64) * (1 << 20) + int(start_year) * 12)
+        has = pos < self.meta['stop'].values
+        baseline = np.full(len(code), np.nan)
+        baseline[has] = self.values[pos[has]]
+        return baseline
+
+    def _change(self, idx, start_year):
+        return self.values[idx] / self.baselines(start_year)[self.codes[idx]] - 1
+
+    def change(self, idx, start_year):
+        '''
+        Returns the cumulative change since start_year for the given rows.
+        '''
+        i = int(start_year) - self.cube_years[0] if len(self.cube_years) else -1
+        if 0 <= i < len(self.cube_years):
+            return self.change_cube[i, idx].astype(np.float64).round(6)
+        return self._change(idx, start_year)
+
+    def frame(self, meta, start_year, end_year):
+        '''
+        Returns a new DataFrame with the series in the given slice of meta, limited to
+        start_year through end_year, with cumulative and annual change filled in.
+        Rows stay sorted by series and date; 'code' is the series' position in meta.
+        '''
+        cols = ['date', 'month', 'value', 'Category', 'series', 'Leaf', 'code',
+                'change', 'yoy_change', 'baseline_year', 'partial_data']
+        if len(meta) == 0:
+            return pd.DataFrame(columns=cols)
+
+        # Slice each series down to the requested window.
+        key = meta['code'].values.astype(np.int64) * (1 << 20)
+        starts = np.searchsorted(self._key, key + int(start_year) * 12)
+        stops = np.searchsorted(self._key, key + (int(end_year) + 1) * 12)
+        lengths = stops - starts
+        idx = np.concatenate([np.arange(a, b) for a, b in zip(starts, stops)])
+
+        # Flag series that start after the requested window.
+        first_year = meta['first_year'].values
+        notes = np.where(first_year > int(start_year), ['Since ' + str(y) for y in first_year], '')
+
+        return pd.DataFrame({
+            'date': self.dates[idx],
+            'month': self.months[idx],
+            'value': self.values[idx],
+            'Category': np.repeat(meta.index.values, lengths),
+            'series': np.repeat(meta['series'].values, lengths),
+            'Leaf': np.repeat(meta['Leaf'].values, lengths),
+            'code': np.repeat(np.arange(len(meta)), lengths),
+            'change': self.change(idx, start_year),
+            'yoy_change': self.yoy[idx].astype(np.float64).round(6),
+            'baseline_year': np.repeat(first_year, lengths),
+            'partial_data': np.repeat(notes, lengths),
+        }, columns=cols)
@@ -0,0 +1,78 @@
+import io
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Formats /export can write, with their content types. Parquet needs pyarrow.
+FORMATS = {'csv': 'text/csv'}
+if pq is not None:
+    FORMATS['parquet'] = 'application/vnd.apache.parquet'
+
+# Columns of an export, in order: the chart's values unrounded, plus what identifies them.
+COLUMNS = ['date', 'Category', 'series', 'value', 'change', 'yoy_change', 'baseline_year', 'partial_data']
+
+def batches(meta, rows):
+    '''
+    Splits meta (a slice of Dataset.meta) into consecutive slices of about `rows`
+    observations each, counting every observation a series has; one series is
+    never split.
+    '''
+    sizes = np.cumsum(meta['stop'].values - meta['start'].values)
+    i = 0
+    while i < len(meta):
+        before = sizes[i - 1] if i else 0
+        j = max(int(np.searchsorted(sizes, before + rows, 'right')), i + 1)
+        yield meta.iloc[i:j]
+        i = j
+
+def csv_chunks(frames):
+    '''
+    Yields the frames as one CSV document, a chunk of UTF-8 bytes per frame after
+    the header.
+    '''
+    yield (','.join(COLUMNS) + '\n').encode('utf-8')
+    for df in frames:
+        if len(df):
+            yield df[COLUMNS].to_csv(index=False, header=False, date_format='%Y-%m-%d').encode('utf-8')
+
+def parquet_schema():
+    return pa.schema([
+        ('date', pa.timestamp('ns')),
+        ('Category', pa.string()),
+        ('series', pa.string()),
+        ('value', pa.float32()),
+        ('change', pa.float64()),
+        ('yoy_change', pa.float64()),
+        ('baseline_year', pa.int64()),
+        ('partial_data', pa.string()),
+    ])
+
+def parquet_chunks(frames):
+    '''
+    Yields the frames as one Parquet file, a row group per frame, handing on each
+    row group's bytes as soon as it is written.
+    '''
+    sink = io.BytesIO()
+    schema = parquet_schema()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for df in frames:
+            if len(df):
+                writer.write_table(pa.Table.from_pandas(df[COLUMNS], schema=schema, preserve_index=False))
+                yield drain(sink)
+    yield drain(sink)
+
+def drain(sink):
+    '''
+    Returns and forgets what has been written to the BytesIO sink so far.
+    '''
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+CHUNKS = {'csv': csv_chunks, 'parquet': parquet_chunks}
@@ -1,13 +1,93 @@
-from flask import Flask, request
+from flask import Flask, Response, request, make_response, stream_with_context
+import importlib.util
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
 import pandas as pd
-import altair as alt
 import numpy as np
-alt.data_transformers.enable('default', max_rows=20000)
-df = pd.read_pickle('/groups/inflation_viz/flaskapp/combined_data.pkl')
-nest = df.set_index('series').dropna().to_dict()['Parent Series ID'] # Gives the series ID of the parent of a given series.
-cat_names = df.set_index('series').dropna().to_dict()['Category'] # Gives the category name of a given series ID.
+from dataset import Dataset
+from reloader import DatasetReloader
+from render_pool import RenderPool, PoolBusy
+from analytics import Correlations
+from basket import basket, check_weights, parse_weights
+from category_tree import ROOT
+from chart_cache import ChartCache, CHART_ARGS, canonical_args, cache_key, chart_etag
+from chart_data import columnar_json, to_columnar, url_chart
+from compression import StaticPage, compress, negotiate
+from export import CHUNKS, FORMATS, batches
+from lod import downsample
+from metrics import Registry, BYTES, stage, timed
+from profiling import Profiler
+from spec_compiler import SpecCompiler, frame_shape, records_json, slot
+from urllib.parse import urlencode
+
+def lazy_import(name):
+    '''
+    Returns a module that is only imported when one of its attributes is first used.
+    '''
+    spec = importlib.util.find_spec(name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+alt = lazy_import('altair') # Only needed once a chart is built, so workers start without it.
 
 app = Flask(__name__)
+app.config['DATA_PATH'] = os.environ.get('INFLATION_VIZ_DATA', '/groups/inflation_viz/flaskapp/combined_data.pkl') # A pickle, or a directory written by Dataset.save().
+app.config['CHART_CACHE_BYTES'] = 64 * 1024 * 1024
+app.config['CHART_DATA_MODE'] = 'inline' # 'inline' embeds rows in the chart HTML, 'url' loads them from /data.
+app.config['CHART_POINT_BUDGET'] = 5000 # Points a line chart draws in all before long windows are thinned out.
+app.config['CHART_LOD'] = 'lttb' # How they are thinned: 'lttb' keeps each line's shape, 'calendar' keeps quarterly or annual points, None keeps every month.
+app.config['CHART_COMPILED'] = True # Fill a precompiled template per chart type instead of building every chart with Altair.
+app.config['DATA_RELOAD_INTERVAL'] = float(os.environ.get('INFLATION_VIZ_RELOAD', 30)) # Seconds between checks for a new DATA_PATH; 0 turns reloading off.
+app.config['DATA_SHARED'] = os.environ.get('INFLATION_VIZ_SHARED', '1') != '0' # Serve a pickle through one memory-mapped copy shared by all workers.
+app.config['DATA_CACHE_DIR'] = os.environ.get('INFLATION_VIZ_CACHE', os.path.join(tempfile.gettempdir(), 'inflation_viz')) # Where shared copies are written.
+app.config['RENDER_WORKERS'] = int(os.environ.get('INFLATION_VIZ_RENDER_WORKERS', 0)) # Processes that build charts; 0 builds them in the request thread.
+app.config['RENDER_QUEUE'] = 8 # Distinct charts that may be rendering or waiting before /chart answers "busy".
+app.config['RENDER_TIMEOUT'] = 60 # Seconds a request waits for its chart before answering "busy".
+app.config['STATIC_MAX_AGE'] = 3600 # Seconds browsers may reuse /, /learn and /credits before revalidating them.
+app.config['PROFILE_DIR'] = os.environ.get('INFLATION_VIZ_PROFILE_DIR') # Where /chart profiles are written; unset turns profiling off.
+app.config['PROFILE_RATE'] = float(os.environ.get('INFLATION_VIZ_PROFILE_RATE', 0)) # Fraction of chart renders profiled at random.
+app.config['PROFILE_TOKEN'] = os.environ.get('INFLATION_VIZ_PROFILE_TOKEN') # /chart?profile=<token> profiles that request.
+app.config['PROFILE_KEEP'] = 50 # Profiles kept on disk; older ones are deleted.
+app.config['CORR_WINDOW'] = 36 # Months in each rolling correlation window.
+app.config['CORR_MAX_LAG'] = 12 # Longest lead or lag, in months, that correlations are checked at.
+app.config['CORR_ROLLING_PAIRS'] = 500 # /correlation sends every pair's rolling correlations for up to this many pairs; beyond that only with ?focus=.
+app.config['HEATMAP_MAX_SERIES'] = 60 # Most series a heatmap correlates; it draws one cell per pair, so wider selections are refused.
+app.config['EXPORT_CHUNK_ROWS'] = 50000 # Observations /export reads and writes at a time, so large exports are never held whole.
+chart_cache = ChartCache(app.config['CHART_CACHE_BYTES']) # Rendered chart HTML, keyed on dataset version and canonical args.
+spec_compiler = SpecCompiler(embed_options={"actions":False}) # Chart page templates, built by Altair once per process.
+profiler = Profiler(app.config['PROFILE_DIR'], app.config['PROFILE_RATE'], app.config['PROFILE_TOKEN'], app.config['PROFILE_KEEP'])
+log = logging.getLogger('inflation_viz')
+
+def load_dataset(path):
+    
+    # Bundles are memory-mapped. A pickle is either converted once into a shared bundle
+    # that every worker maps, or read and indexed in full by each worker.
+    if os.path.isdir(path):
+        return Dataset.load(path)
+    if app.config['DATA_SHARED']:
+        return Dataset.shared(path, app.config['DATA_CACHE_DIR'])
+    return Dataset.from_pickle(path)
+
+# Read-only arrays shared by every request, replaced in the background when DATA_PATH changes.
+datasets = DatasetReloader(app.config['DATA_PATH'], load_dataset, app.config['DATA_RELOAD_INTERVAL'])
+
+@datasets.on_swap
+def drop_retired_charts(reloader):
+
+    # Cache keys are (mode or 'data', version, args..., [content coding]); entries for versions no longer held can never be hit again.
+    chart_cache.discard(lambda key: key[1] not in reloader.versions)
+
+@app.before_request
+def start_background_work():
+    datasets.start()
+    render_pool.start()
 
 def build_arg_text(**args):
     
@@ -21,83 +101,94 @@ def build_arg_text(**args):
     
     return arg_text
 
-def data_parse(df, **args):
+def data_parse(ds, **args):
     
-    print(args)
+    log.debug('data_parse %s', args)
 
-    website = 'https://apps-summer22.ischool.berkeley.edu/inflation_viz/chart'
-    arg_text = website + build_arg_text(**args)
-    
-    start_date = '1/1/' + str(args.get('start_year','2000'))
-    end_date = '12/1/' + str(args.get('end_year','2021'))
-    start_year = int(args.get('start_year',2000))
-    end_year = int(args.get('end_year',2021))
+    with stage('select'):
+        meta = select_series(ds, **args)
 
-    # Start off with no hyperlinks and add where needed.
-    df['href'] = arg_text
-    
-    # CPI
-    df_cpi = pd.DataFrame(columns=['date','change','Category','href'])
-    if args.get('parent','') == '':
-        if args.get('inflation','By Category') == 'Exclude':
-            df_cpi = pd.DataFrame(columns=['date','change','Category','href'])
-        elif args.get('inflation','By Category') == 'By Category':
-            df_cpi = df[df['Parent Series ID'] == 'CUSR0000SA0']
-        elif args.get('inflation','By Category') == 'Total':
-            df_cpi = df[df['series'] == 'CUSR0000SA0']
+    # Combine selected data. Changes come precomputed from the dataset.
+    with stage('frame'):
+        df = ds.frame(meta, int(args.get('start_year',2000)), int(args.get('end_year',2021)))
+
+    return df
+
+def select_series(ds, **args):
+    '''
+    Returns the rows of ds.meta for the series a chart with these args shows.
+    '''
+    # Pick series from the metadata table; observations are only copied for the selected series.
+    meta = ds.meta
+    tree = ds.tree
+
+    # CPI. The category tree gives the children (or all leaves) of a series without scanning meta.
+    parent = args.get('parent','')
+    if parent == '' and args.get('inflation','By Category') == 'By Category':
+        parent = ROOT
+    if parent == '' and args.get('inflation','By Category') == 'Total':
+        meta_cpi = tree.select([tree.pos[ROOT]] if ROOT in tree else [])
+    elif parent == '':
+        meta_cpi = meta.iloc[:0]
+    elif args.get('expand','') == 'Leaves':
+        meta_cpi = tree.select(tree.leaves(parent))
     else:
-        df_cpi = df[df['Parent Series ID'] == args.get('parent','')]
-        
-    if args.get('inflation','By Category') != 'Exclude':
-        #df_cpi['Category'] = 'CPI - ' + df_cpi['Category']
-        df_cpi['href'] = np.where(df_cpi['Leaf'] == 0, arg_text + '&parent=' + df_cpi['series'], arg_text)
-        
+        meta_cpi = tree.select(tree.children(parent))
+    
     # Earnings
     if args.get('earnings','') in ['','Exclude']:
-        df_earnings = pd.DataFrame()
+        meta_earnings = meta.iloc[:0]
     else:
-        df_earnings = df[(df['Type'] == 'Earnings') & (df['Bucket'] == args.get('earnings','').replace('+',' '))]
-        
+        meta_earnings = meta[(meta['Type'] == 'Earnings') & (meta['Bucket'] == args.get('earnings','').replace('+',' '))]
+    
     # Unemployment
     if args.get('unemployment','') in ['','Exclude']:
-        df_unemployment = pd.DataFrame()
+        meta_unemployment = meta.iloc[:0]
     else:
-        df_unemployment = df[(df['Type'] == 'Unemployment') & (df['Bucket'] == args.get('unemployment','').replace('+',' '))]
-        
+        meta_unemployment = meta[(meta['Type'] == 'Unemployment') & (meta['Bucket'] == args.get('unemployment','').replace('+',' '))]
+    
     # Stocks
     if args.get('stocks','') in ['','Exclude']:
-        df_stocks = pd.DataFrame()
+        meta_stocks = meta.iloc[:0]
     else:
-        df_stocks = df[df['Type'] == 'Stocks'] 
-
-    # Combine selected data.
-    df = pd.concat([df_cpi, df_earnings, df_unemployment, df_stocks])
-
-    # Skip remaining steps if df is empty.
-    if len(df) == 0:
-        return df
-
-    # Normalize values to % change in the specific category from start of date window.
-    baseline_dict, ac_dict = {}, {}
-    series_start_dt = df[['date','value','Category']].groupby('Category').date.min().to_dict()
-    min_dt = df[df['date'] >= start_date][['date','value','Category']].groupby('Category').date.min().to_dict()
-    for k,v in min_dt.items():
-        baseline_dict[k] = df[(df['Category'] == k) & (df['date'] == v)].value.item()
-    df['baseline'] = df['Category'].map(baseline_dict) 
-    df['change'] = df['value']/df['baseline'] - 1
-    df['baseline_year'] = df['Category'].map(series_start_dt).dt.year
-    df['partial_data'] = np.where(df['baseline_year'] > int(args.get('start_year','2000')), "Since " + df['baseline_year'].astype(str), "")
-
-    # Looking up anual change
-    cat_list = df['Category'].to_list()
-    date_list = df['date'].to_list()
-    val_list = df['value'].to_list()
-    val_lookup = dict(zip(zip(cat_list,date_list), val_list))
-    df['past_key']  = list(zip(df['Category'], df['date'] - pd.offsets.DateOffset(years=1)))
-    df['past_val'] = df['past_key'].map(val_lookup)
-    df['yoy_change'] = df['value'] / df['past_val'] - 1
+        meta_stocks = meta[meta['Type'] == 'Stocks'] 
 
-    return df
+    return pd.concat([meta_cpi, meta_earnings, meta_unemployment, meta_stocks])
+
+def series_links(df, **args):
+    '''
+    Returns one hyperlink per Category in df. CPI categories with children link to
+    their drill-down chart; everything else links back to the current chart.
+    '''
+    website = 'https://apps-summer22.ischool.berkeley.edu/inflation_viz/chart'
+    arg_text = website + build_arg_text(**args)
+
+    # Only CPI series have a Leaf flag, so this also leaves other data types unlinked.
+    links = df.drop_duplicates('Category')[['Category','series','Leaf']]
+    has_children = (links['Leaf'] == 0) & (args.get('inflation','By Category') != 'Exclude')
+    links['href'] = np.where(has_children, arg_text + '&parent=' + links['series'].astype(str), arg_text)
+
+    return links[['Category','href']]
+
+def with_links(chart, links):
+    '''
+    Adds an href field to every row of chart, looked up from its Category in links
+    (the series_links() rows), so the link is only built and sent once per series.
+    '''
+    return chart.transform_lookup(lookup='Category', from_=alt.LookupData(data=links, key='Category', fields=['href']))
+
+def change_title(start_year, end_year):
+
+    if end_year != start_year:
+        return 'Change ' + str(start_year) + ' to ' + str(end_year)
+    return 'Change during ' + str(start_year)
+
+def color_scheme(df):
+
+    # Set color scheme based on the number of categories.
+    if len(df['Category'].unique()) > 10:
+        return 'category20'
+    return 'category10'
 
 def build_line(df, **args):
     
@@ -108,63 +199,66 @@ def build_line(df, **args):
     end_date = '12/1/' + str(end_year)
     
     # Create title.
-    if end_year != start_year:
-        c_title = 'Change ' + str(start_year) + ' to ' + str(end_year)
-    else:
-        c_title = 'Change during ' + str(start_year)
+    c_title = change_title(start_year, end_year)
     
     # Set color scheme based on the number of categories.
-    if len(df['Category'].unique()) > 10:
-        c_scheme = 'category20'
-    else:
-        c_scheme = 'category10'
+    c_scheme = color_scheme(df)
         
-    # Check for hrefs.
-    has_hrefs = len(df[df['href'] != 'None']) > 0
-    has_non_hrefs = len(df[df['href'] == 'None']) > 0
-    
     # Line Chart
-    t_chart = alt.Chart(df[['date','change','Category','href']][(df['date'] >= start_date) & (df['date'] <= end_date) & (df['href'] != '')], title=c_title + ' by Category').mark_line(strokeWidth=2.5).encode(
+    t_chart = with_links(alt.Chart(df[['date','change','Category']][(df['date'] >= start_date) & (df['date'] <= end_date)], title=c_title + ' by Category'), series_links(df, **args)).mark_line(strokeWidth=2.5).encode(
             x = alt.X('date', title = 'Year'),
             y = alt.Y('change', title = c_title, axis=alt.Axis(format='%')),
             color = alt.Color('Category', scale=alt.Scale(scheme = c_scheme)),
             tooltip = 'Category',
-            href = alt.Href('href')
+            href = alt.Href('href:N')
         ).properties(height=400, width=600)
         
     t_chart['usermeta'] = {"embedOptions": {'loader': {'target': '_chart'}}}
     
     return t_chart
 
-def build_bar(df, **args):
-    
-    # Set dates.
-    start_year = int(args.get('start_year',2000))
-    start_date = '1/1/' + str(start_year)
-    end_year = int(args.get('end_year',2021))
-    end_date = '12/1/' + str(end_year)
-    
-    # Create title.
-    if end_year != start_year:
-        c_title = 'Change ' + str(start_year) + ' to ' + str(end_year)
-    else:
-        c_title = 'Change during ' + str(start_year)
-    
-    # Set color scheme based on the number of categories.
-    if len(df['Category'].unique()) > 10:
-        c_scheme = 'category20'
-    else:
-        c_scheme = 'category10'
+def data_url(**args):
+    '''
+    The /data URL of a chart's rows. args['v'] is the version of the dataset the chart is drawn from;
+    it pins the data to this chart and lets browsers cache it indefinitely.
+    '''
+    return 'data?' + urlencode(args)
+
+def data_chart(data, **args):
+    '''
+    Starts an Altair chart on data, either inline or, in 'url' mode, loaded from the /data endpoint.
+    '''
+    if app.config['CHART_DATA_MODE'] != 'url':
+        return alt.Chart(data)
+
+    return url_chart(data_url(**args), data)
+
+def bar_data(df, **args):
+
+    end_date = '12/1/' + str(args.get('end_year',2021))
+
+    # Quarterly series are stored on M03/M06/M09/M12, so the 4th quarter also falls on the end date.
+    return df[['date','change','Category','partial_data']][df['date'] == end_date]
+
+def bar_parts(df, **args):
+    '''
+    Returns the rows a bar chart draws and the other values bar_spec() builds it from.
+    '''
+    c_title = change_title(int(args.get('start_year',2000)), int(args.get('end_year',2021)))
+
+    return bar_data(df, **args), {'links': series_links(df, **args), 'c_title': c_title, 'c_scheme': color_scheme(df)}
+
+def bar_spec(chart, links, c_title, c_scheme):
         
     # Bar Chart
-    t_chart = alt.Chart(df[['date','change','Category','href','partial_data']][(df['date'] == end_date) | ((df['periodName'] == '4th Quarter') & (df['year'] == end_year))]).mark_bar().encode(
-            x = alt.X('Category', sort='y', axis=alt.Axis(labels=False)),
-            y = alt.Y('change', title=c_title, axis=alt.Axis(format='%')),
-            color = alt.Color('Category', scale=alt.Scale(scheme = c_scheme)),
-            tooltip = ['Category',
+    t_chart = with_links(chart, links).mark_bar().encode(
+            x = alt.X('Category:N', sort='y', axis=alt.Axis(labels=False)),
+            y = alt.Y('change:Q', title=c_title, axis=alt.Axis(format='%')),
+            color = alt.Color('Category:N', scale=alt.Scale(scheme = c_scheme)),
+            tooltip = ['Category:N',
                    alt.Tooltip('change:Q',title = "Total Change",  format='.1%'), 
-                   alt.Tooltip('partial_data',title = "Notes")],
-            href = alt.Href('href')
+                   alt.Tooltip('partial_data:N',title = "Notes")],
+            href = alt.Href('href:N')
         ).properties(height=400, width=600)
     
     
@@ -172,45 +266,63 @@ def build_bar(df, **args):
     
     return t_chart
 
-def build_line_v2(df, **args):
-    
+def build_bar(df, **args):
+
+    data, values = bar_parts(df, **args)
+    return bar_spec(data_chart(data, **args), **values)
+
+def line_data(df, **args):
+
     # Set dates.
     start_year = args.get('start_year',2000)
     start_date = '1/1/' + str(start_year)
     ar_start_year = '1/1/' + str(int(start_year) - 1)
     end_year = args.get('end_year',2021)
     end_date = '12/1/' + str(end_year)
-    
-    # Create title.
-    if end_year != start_year:
-        c_title = 'Change ' + str(start_year) + ' to ' + str(end_year)
-    else:
-        c_title = 'Change during ' + str(start_year)
 
     df_test = df.loc[(df['date'] >= ar_start_year) & (df['date'] <= end_date)]
     
     # new data frame with only graph values
-    graph_data = df_test[['date', 'Category', 'change','yoy_change', 'href']]
+    graph_data = df_test[['date', 'Category', 'change','yoy_change']]
     graph_data['change'] = graph_data['change'].round(decimals = 3)
     graph_data['yoy_change'] = graph_data['yoy_change'].round(decimals = 3)
     graph_data = graph_data[graph_data['date'] >= start_date]
-    
+
+    # Keep long windows and many series within the point budget.
+    if app.config['CHART_LOD']:
+        with stage('lod'):
+            graph_data, _ = downsample(graph_data, app.config['CHART_POINT_BUDGET'], app.config['CHART_LOD'])
+
+    return graph_data
+
+def line_parts(df, **args):
+    '''
+    Returns the rows a line chart draws and the other values line_spec() builds it from.
+    '''
+    c_title = change_title(args.get('start_year',2000), args.get('end_year',2021))
+
+    graph_data = line_data(df, **args)
     s2 = pd.DataFrame(graph_data.Category.unique(), columns = ['Category'])
+
+    return graph_data, {'links': series_links(df, **args), 'legend': s2, 'c_title': c_title}
+
+def line_spec(chart, links, legend, c_title):
+    
     highlight = alt.selection_multi(on = 'mouseover', fields=['Category'], nearest = True)
 
-    line = alt.Chart(graph_data).mark_line(interpolate = 'basis', strokeWidth=3).encode(
+    line = with_links(chart, links).mark_line(interpolate = 'basis', strokeWidth=3).encode(
         x = alt.X('date:T', title = "Year"),
         y = alt.Y('change:Q', title = c_title, axis=alt.Axis(ticks = False, domain = False, format='%')),
-        tooltip = [alt.Tooltip('date:T', title = 'Date', format='%B %Y'), 'Category',
+        tooltip = [alt.Tooltip('date:T', title = 'Date', format='%B %Y'), 'Category:N',
                    alt.Tooltip('change:Q',title = "Cumulative Change",  format='.1%'), 
                    alt.Tooltip('yoy_change:Q',title = "Annual Change",  format='.1%')],    
         color = alt.Color('Category:N'),
-        href = alt.Href('href'),
+        href = alt.Href('href:N'),
         opacity = alt.condition(highlight, alt.value(1), alt.value(0.2))).properties(
         width=600, height=400
     )
 
-    hover_legend = alt.Chart(s2).mark_circle(size = 100).encode(
+    hover_legend = alt.Chart(legend).mark_circle(size = 100).encode(
         y = alt.Y('Category:N', axis = alt.Axis(orient = 'right', domain = False, ticks = False), title = None),
         color = alt.Color('Category:N', legend = None),
         opacity = alt.condition(highlight, alt.value(1), alt.value(0.2))
@@ -227,8 +339,91 @@ def build_line_v2(df, **args):
     
     return t_chart
 
-@app.route("/learn")
-def learn_page():
+def build_line_v2(df, **args):
+
+    data, values = line_parts(df, **args)
+    return line_spec(data_chart(data, **args), **values)
+
+def heatmap_too_wide(df):
+
+    # A heatmap draws every pair of series, so its size grows with the square of their number.
+    return df['Category'].nunique() > app.config['HEATMAP_MAX_SERIES']
+
+def heatmap_data(df, **args):
+
+    # Every pair of series, correlated on their annual changes over the chart's years.
+    if heatmap_too_wide(df):
+        return pd.DataFrame()
+    return Correlations(df, 'yoy_change', app.config['CORR_WINDOW'], app.config['CORR_MAX_LAG']).heatmap()
+
+def heatmap_parts(df, **args):
+    '''
+    Returns the cells a heatmap draws and the other values heatmap_spec() builds it from.
+    '''
+    start_year, end_year = args.get('start_year',2000), args.get('end_year',2021)
+    c_title = 'Correlation of Annual Change, ' + (str(start_year) + ' to ' + str(end_year) if start_year != end_year else str(start_year))
+    w_title = 'Last ' + str(app.config['CORR_WINDOW']) + ' Months'
+
+    return heatmap_data(df, **args), {'c_title': c_title, 'w_title': w_title}
+
+def heatmap_spec(chart, c_title, w_title):
+
+    # Heatmap. A positive lead means the row's series moves first.
+    t_chart = chart.mark_rect().encode(
+            x = alt.X('x:N', sort=alt.EncodingSortField('xi'), title=None, axis=alt.Axis(labels=False, ticks=False)),
+            y = alt.Y('y:N', sort=alt.EncodingSortField('yi'), title=None),
+            color = alt.Color('corr:Q', title='Correlation', scale=alt.Scale(scheme='redblue', domain=[-1, 1])),
+            tooltip = [alt.Tooltip('y:N', title = 'Category'),
+                   alt.Tooltip('x:N', title = 'With'),
+                   alt.Tooltip('corr:Q', title = 'Correlation', format='.2f'),
+                   alt.Tooltip('last:Q', title = w_title, format='.2f'),
+                   alt.Tooltip('lag:Q', title = 'Best Lead (Months)'),
+                   alt.Tooltip('lag_corr:Q', title = 'Correlation at Best Lead', format='.2f')]
+        ).properties(height=400, width=600, title=c_title)
+
+    t_chart['usermeta'] = {"embedOptions": {'loader': {'target': '_chart'}}}
+
+    return t_chart
+
+def build_heatmap(df, **args):
+
+    data, values = heatmap_parts(df, **args)
+    return heatmap_spec(data_chart(data, **args), **values)
+
+# How each chart type is drawn: a function picking its rows and spec values, and one building its spec.
+CHART_SPECS = {'Line Chart': (line_parts, line_spec), 'Bar Chart': (bar_parts, bar_spec), 'Heatmap': (heatmap_parts, heatmap_spec)}
+
+def compiled_html(spec, data, args, **values):
+    '''
+    Renders spec(chart, **values) for data by filling its precompiled template, which
+    Altair builds and validates once per process. In the template every DataFrame
+    value is a named dataset and every string a slot(), so values must not change
+    the spec's structure, only what it shows.
+    '''
+    mode = app.config['CHART_DATA_MODE']
+    tables = [name for name, value in values.items() if isinstance(value, pd.DataFrame)]
+
+    def build():
+        if mode == 'url':
+            chart = url_chart(slot('url'), data)
+        else:
+            chart = alt.Chart(alt.NamedData(name='rows'))
+        return spec(chart, **{name: alt.NamedData(name=name) if name in tables else slot(name) for name in values})
+
+    with stage('template'):
+        template = spec_compiler.template((spec.__name__, mode, frame_shape(data)), build, tables + ([] if mode == 'url' else ['rows']))
+
+    with stage('encode'):
+        slots = {name: records_json(value) if name in tables else json.dumps(value) for name, value in values.items()}
+        if mode == 'url':
+            slots['url'] = json.dumps(data_url(**args))
+        else:
+            slots['rows'] = records_json(data)
+
+    with stage('fill'):
+        return template.fill(**slots)
+
+def learn_html():
     learn_html = """
     <html>
     <head>
@@ -308,8 +503,7 @@ def learn_page():
     return learn_html
 
 
-@app.route("/credits")
-def credits_page():
+def credits_html():
     credits_html = """
     <html>
     <head>
@@ -379,8 +573,7 @@ def credits_page():
     """
     return credits_html
 
-@app.route("/")
-def main_page():
+def main_html(first_year, last_year):
     main_html = """
 <html>
 <head>
@@ -504,6 +697,7 @@ button {
 <ul>
     <li>Explore how a certain indicator evolved over the years. Action: choose Line Chart on the chart type dropdown.</li>
     <li>Compare or find a specific value of an indicator. Action: choose Bar Chart on the chart type dropdown.</li>
+    <li>See which indicators move together, and which move first. Action: choose Heatmap on the chart type dropdown.</li>
 </ul>
 
 <p><b>Step 2: What period are you interested in?</b></p>
@@ -536,122 +730,21 @@ button {
     <select name = "chart_type" id="chart_type">
       <option value = "Line Chart" selected>Line Chart</option>
       <option value = "Bar Chart">Bar Chart</option>
+      <option value = "Heatmap">Heatmap</option>
     </select>
   </li>
 
   <li>
     <label for = "start_year">Start Year:</label>
     <select name = "start_year" id="start_year">
-      <option value = "1970">1970</option>
-      <option value = "1971">1971</option>
-      <option value = "1972">1972</option>
-      <option value = "1973">1973</option>
-      <option value = "1974">1974</option>
-      <option value = "1975">1975</option>
-      <option value = "1976">1976</option>
-      <option value = "1977">1977</option>
-      <option value = "1978">1978</option>
-      <option value = "1979">1979</option>
-      <option value = "1980">1980</option>
-      <option value = "1981">1981</option>
-      <option value = "1982">1982</option>
-      <option value = "1983">1983</option>
-      <option value = "1984">1984</option>
-      <option value = "1985">1985</option>
-      <option value = "1986">1986</option>
-      <option value = "1987">1987</option>
-      <option value = "1988">1988</option>
-      <option value = "1989">1989</option>
-      <option value = "1990">1990</option>
-      <option value = "1991">1991</option>
-      <option value = "1992">1992</option>
-      <option value = "1993">1993</option>
-      <option value = "1994">1994</option>
-      <option value = "1995">1995</option>
-      <option value = "1996">1996</option>
-      <option value = "1997">1997</option>
-      <option value = "1998">1998</option>
-      <option value = "1999">1999</option>
-      <option value = "2000" selected>2000</option>
-      <option value = "2001">2001</option>
-      <option value = "2002">2002</option>
-      <option value = "2003">2003</option>
-      <option value = "2004">2004</option>
-      <option value = "2005">2005</option>
-      <option value = "2006">2006</option>
-      <option value = "2007">2007</option>
-      <option value = "2008">2008</option>
-      <option value = "2009">2009</option>
-      <option value = "2010">2010</option>
-      <option value = "2011">2011</option>
-      <option value = "2012">2012</option>
-      <option value = "2013">2013</option>
-      <option value = "2014">2014</option>
-      <option value = "2015">2015</option>
-      <option value = "2016">2016</option>
-      <option value = "2017">2017</option>
-      <option value = "2018">2018</option>
-      <option value = "2019">2019</option>
-      <option value = "2020">2020</option>
-      <option value = "2021">2021</option>
+@@start_year_options@@
     </select>
   </li>
 
   <li>
     <label for = "end_year">End Year:</label>
     <select name = "end_year" id="end_year">
-      <option value = "1970">1970</option>
-      <option value = "1971">1971</option>
-      <option value = "1972">1972</option>
-      <option value = "1973">1973</option>
-      <option value = "1974">1974</option>
-      <option value = "1975">1975</option>
-      <option value = "1976">1976</option>
-      <option value = "1977">1977</option>
-      <option value = "1978">1978</option>
-      <option value = "1979">1979</option>
-      <option value = "1980">1980</option>
-      <option value = "1981">1981</option>
-      <option value = "1982">1982</option>
-      <option value = "1983">1983</option>
-      <option value = "1984">1984</option>
-      <option value = "1985">1985</option>
-      <option value = "1986">1986</option>
-      <option value = "1987">1987</option>
-      <option value = "1988">1988</option>
-      <option value = "1989">1989</option>
-      <option value = "1990">1990</option>
-      <option value = "1991">1991</option>
-      <option value = "1992">1992</option>
-      <option value = "1993">1993</option>
-      <option value = "1994">1994</option>
-      <option value = "1995">1995</option>
-      <option value = "1996">1996</option>
-      <option value = "1997">1997</option>
-      <option value = "1998">1998</option>
-      <option value = "1999">1999</option>
-      <option value = "2000">2000</option>
-      <option value = "2001">2001</option>
-      <option value = "2002">2002</option>
-      <option value = "2003">2003</option>
-      <option value = "2004">2004</option>
-      <option value = "2005">2005</option>
-      <option value = "2006">2006</option>
-      <option value = "2007">2007</option>
-      <option value = "2008">2008</option>
-      <option value = "2009">2009</option>
-      <option value = "2010">2010</option>
-      <option value = "2011">2011</option>
-      <option value = "2012">2012</option>
-      <option value = "2013">2013</option>
-      <option value = "2014">2014</option>
-      <option value = "2015">2015</option>
-      <option value = "2016">2016</option>
-      <option value = "2017">2017</option>
-      <option value = "2018">2018</option>
-      <option value = "2019">2019</option>
-      <option value = "2020">2020</option>
-      <option value = "2021" selected>2021</option>
+@@end_year_options@@
     </select>
   </li>
 
@@ -706,13 +799,69 @@ button {
 </html>
 
     """
+
+    # The year lists cover the years the dataset has, with the chart's default window selected.
+    defaults = dict(CHART_ARGS)
+    for name in ['start_year', 'end_year']:
+        selected = min(max(int(defaults[name]), first_year), last_year)
+        options = ['      <option value = "%d"%s>%d</option>' % (y, ' selected' if y == selected else '', y) for y in range(first_year, last_year + 1)]
+        main_html = main_html.replace('@@%s_options@@' % name, '\n'.join(options))
+
     return main_html
 
-@app.route("/chart")
-def chart_render():
-    
-    # Parse arguments.
-    args = request.args.to_dict()  
+# The static pages, rendered and compressed once; the main page again when a reload changes the years.
+static_pages = {}
+
+def last_full_year(ds):
+    '''
+    The last year the CPI total has a December for. Bar charts compare series at
+    December of the end year, so later, partial years are not offered.
+    '''
+    months = ds.months
+    if ROOT in ds.tree:
+        row = ds.meta.iloc[ds.tree.pos[ROOT]]
+        months = months[row['start']:row['stop']]
+    december = months[months % 12 == 11]
+    return int(december.max()) // 12 if len(december) else int(ds.months.max()) // 12 - 1
+
+def build_pages(ds):
+    static_pages['learn'] = StaticPage(learn_html())
+    static_pages['credits'] = StaticPage(credits_html())
+    static_pages['main'] = StaticPage(main_html(int(ds.months.min()) // 12, last_full_year(ds)))
+
+build_pages(datasets.current)
+
+@datasets.on_swap
+def rebuild_pages(reloader):
+    build_pages(reloader.current)
+
+def static_response(name):
+    encoding, body, etag = static_pages[name].choose(request.accept_encodings)
+    response = make_response(body)
+    if encoding != 'identity':
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['STATIC_MAX_AGE']
+    return response.make_conditional(request)
+
+@app.route("/learn")
+def learn_page():
+    return static_response('learn')
+
+@app.route("/credits")
+def credits_page():
+    return static_response('credits')
+
+@app.route("/")
+def main_page():
+    return static_response('main')
+
+def render_chart(ds, **args):
+
+    # Altair is imported lazily, so apply its settings here rather than at import.
+    alt.data_transformers.enable('default', max_rows=20000)
     
     # Check to see if all datatypes are being excluded.
     if args.get('inflation','By Category') == 'Exclude' and args.get('earnings','Exclude') == 'Exclude' and args.get('unemployment','Exclude') == 'Exclude' and args.get('stocks','Exclude') == 'Exclude':
@@ -723,21 +872,411 @@ def chart_render():
         return '<font color="red">Error: No data to display. Please try different chart settings.</font>'
 
     # Fetch data.
-    t_df = data_parse(df.copy(deep=True), **args)
+    t_df = data_parse(ds, **args)
     
     # Check for blank DataFrame.
     if len(t_df) == 0:
         return '<font color="red">Error: No data to display. Please try different chart settings.</font>'
 
-    if args.get('chart_type','Line Chart') == 'Line Chart':
-        out_html = build_line_v2(t_df, **args)
-        pass
-    elif args.get('chart_type','') == 'Bar Chart':
-        out_html = build_bar(t_df, **args)
-    else:
+    if args.get('chart_type','Line Chart') not in CHART_SPECS:
         return ''
+
+    if args.get('chart_type') == 'Heatmap' and heatmap_too_wide(t_df):
+        return '<font color="red">Error: A heatmap can compare at most %d categories; this chart has %d. Please choose fewer categories.</font>' % (
+            app.config['HEATMAP_MAX_SERIES'], t_df['Category'].nunique())
+    parts, spec = CHART_SPECS[args.get('chart_type','Line Chart')]
+    with stage('data'):
+        data, values = parts(t_df, **args)
+
+    # Series can have no rows in the chart itself, e.g. a bar chart ending in a year without a December.
+    if len(data) == 0:
+        return '<font color="red">Error: No data to display. Please try different chart settings.</font>'
+    args = dict(args, v=ds.version)
+
+    if app.config['CHART_COMPILED']:
+        return compiled_html(spec, data, args, **values)
+
+    with stage('build'):
+        chart = spec(data_chart(data, **args), **values)
+    with stage('html'):
+        return chart.to_html(embed_options={"actions":False})
+
+def pooled_render(version, mode, args):
+    '''
+    Renders a chart for render_pool. In a render worker process this module holds its
+    own handle on the (shared, memory-mapped) dataset and catches up with a reload if
+    asked for a version it has not loaded yet. Returns the version used, the HTML,
+    and how long each stage of the render took.
+    '''
+    ds = datasets.get(version)
+    if ds.version != version:
+        datasets.check()
+        ds = datasets.get(version)
+    app.config['CHART_DATA_MODE'] = mode
+    with timed() as timer, stage('render'):
+        html = render_chart(ds, **args).encode('utf-8')
+    return ds.version, html, timer.stages
+
+# Identical /chart requests in flight share one render, and a full queue answers "busy" at once.
+render_pool = RenderPool(pooled_render, app.config['RENDER_WORKERS'], app.config['RENDER_QUEUE'])
+
+def busy_response():
+
+    response = make_response('<font color="red">The site is busy right now. Please try again in a moment.</font>', 503)
+    response.headers['Retry-After'] = '1'
+    response.cache_control.no_store = True
+    return response
+
+# Metrics of this process, served by /metrics.
+registry = Registry()
+chart_seconds = registry.histogram('inflation_viz_chart_seconds', 'Time to answer /chart.', ['chart_type', 'inflation', 'cache'])
+stage_seconds = registry.histogram('inflation_viz_chart_stage_seconds', 'Time spent in each stage of /chart.', ['stage'])
+response_bytes = registry.histogram('inflation_viz_response_bytes', 'Size of /chart, /data and /correlation bodies sent.', ['endpoint', 'chart_type'], BYTES)
+cache_requests = registry.counter('inflation_viz_cache_requests_total', 'Chart cache lookups by endpoint and result.', ['endpoint', 'cache'])
+registry.sampled('inflation_viz_chart_cache_bytes', 'Bytes held by the chart cache.', lambda: chart_cache.bytes)
+registry.sampled('inflation_viz_chart_cache_entries', 'Entries in the chart cache.', lambda: len(chart_cache))
+registry.sampled('inflation_viz_renders_total', 'Chart renders by outcome: run, joined one in flight, or rejected as busy.',
+                 lambda: {('run',): render_pool.submitted, ('joined',): render_pool.joined, ('rejected',): render_pool.rejected}, ['outcome'], 'counter')
+registry.sampled('inflation_viz_renders_pending', 'Distinct charts rendering or queued.', lambda: render_pool.pending())
+registry.sampled('inflation_viz_spec_templates', 'Chart templates compiled by this process.', lambda: spec_compiler.compiled)
+registry.sampled('inflation_viz_profiles_total', 'Chart renders profiled to PROFILE_DIR.', lambda: profiler.captured, kind='counter')
+registry.sampled('inflation_viz_dataset_reloads_total', 'Dataset reloads by outcome.',
+                 lambda: {('ok',): datasets.reloads, ('failed',): datasets.errors}, ['outcome'], 'counter')
+
+def chart_labels(args):
+
+    # Keep label values to a known set so odd query strings cannot create new series.
+    chart_type = args.get('chart_type','Line Chart')
+    inflation = args.get('inflation','By Category')
+    return (chart_type if chart_type in CHART_SPECS else 'other',
+            inflation if inflation in ('By Category', 'Total', 'Exclude') else 'other')
+
+# Data behind each chart type, as drawn by its build function.
+CHART_DATA = {'Line Chart': line_data, 'Bar Chart': bar_data, 'Heatmap': heatmap_data}
+
+def chart_data(ds, **args):
+
+    data_fn = CHART_DATA.get(args.get('chart_type','Line Chart'))
+    if data_fn is None or int(args.get('start_year',2000)) > int(args.get('end_year',2021)):
+        return pd.DataFrame()
+
+    t_df = data_parse(ds, **args)
+    if len(t_df) == 0:
+        return pd.DataFrame()
+
+    return data_fn(t_df, **args)
+
+def compressed(key, body, encoding):
+    '''
+    body, the cached chart or data for key, compressed with encoding. The compressed
+    bytes are cached next to it, so each chart is compressed once per coding.
+    '''
+    packed = chart_cache.get(key + (encoding,))
+    if packed is None:
+        packed = compress(body, encoding)
+        chart_cache.put(key + (encoding,), packed)
+    return packed
+
+@app.route("/data")
+def data_render():
+
+    # Serve the rows for a chart in the columnar form its 'url' mode spec decodes, from
+    # the dataset version the chart was drawn from if it is still held.
+    ds = datasets.get(request.args.get('v'))
+    args = canonical_args(request.args.to_dict())
+    key = ('data',) + cache_key(ds.version, args)
+    body = chart_cache.get(key)
+    cache_requests.inc('data', 'miss' if body is None else 'hit')
+    if body is None:
+        body = columnar_json(chart_data(ds, **args)).encode('utf-8')
+        chart_cache.put(key, body)
+    encoding = negotiate(request.accept_encodings, len(body))
+    if encoding != 'identity':
+        body = compressed(key, body, encoding)
+    response_bytes.observe(len(body), 'data', chart_labels(args)[0])
+
+    response = make_response(body)
+    response.mimetype = 'application/json'
+    if encoding != 'identity':
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['X-Dataset-Version'] = ds.version
+
+    # Versioned URLs never change; anything else has to be revalidated.
+    if request.args.get('v') == ds.version:
+        response.cache_control.public = True
+        response.cache_control.max_age = 365 * 24 * 3600
+        response.cache_control.immutable = True
+    else:
+        response.set_etag(chart_etag(key), weak=True)
+        response.last_modified = ds.modified
+        response.cache_control.no_cache = True
+
+    return response.make_conditional(request)
+
+def export_frames(ds, meta, **args):
+    '''
+    Yields the rows behind a chart a batch of series at a time: every month of a
+    line chart's window (not thinned or rounded as drawn) or the month a bar chart shows.
+    '''
+    start_year, end_year = int(args.get('start_year',2000)), int(args.get('end_year',2021))
+    for part in batches(meta, app.config['EXPORT_CHUNK_ROWS']):
+        df = ds.frame(part, start_year, end_year)
+        if args.get('chart_type') == 'Bar Chart':
+            df = df.loc[bar_data(df, **args).index]
+        yield df
+
+@app.route("/export")
+def export_render():
+    '''
+    Streams the numbers behind a chart, e.g. /export?format=csv&chart_type=Line+Chart&parent=CUSR0000SAF
+    takes every /chart arg, plus format (csv, or parquet where pyarrow is installed).
+    '''
+    start = time.perf_counter()
+
+    # Stream the whole export from one dataset, even if a reload swaps it meanwhile.
+    ds = datasets.current
+    args = canonical_args(request.args.to_dict())
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in FORMATS:
+        error = 'format must be one of: %s' % ', '.join(FORMATS)
+    elif not all(args[name].lstrip('-').isdigit() for name in ('start_year', 'end_year')):
+        error = 'start_year and end_year must be years'
+    else:
+        error = None
+    if error:
+        response = make_response(json.dumps({'error': error}), 400)
+        response.mimetype = 'application/json'
+        return response
+
+    # The same series as the chart; nothing for charts that would be empty.
+    if args['chart_type'] in CHART_DATA and int(args['start_year']) <= int(args['end_year']):
+        meta = select_series(ds, **args)
+    else:
+        meta = ds.meta.iloc[:0]
+
+    def generate():
+        sent = 0
+        try:
+            for chunk in CHUNKS[fmt](export_frames(ds, meta, **args)):
+                sent += len(chunk)
+                yield chunk
+        finally:
+            log.info('export format=%s series=%d bytes=%d ms=%.1f version=%s args=%s',
+                     fmt, len(meta), sent, (time.perf_counter() - start) * 1e3, ds.version, urlencode(args))
+
+    # No Content-Length: the body is sent in chunks as it is written.
+    response = Response(stream_with_context(generate()), mimetype=FORMATS[fmt])
+    response.headers['Content-Disposition'] = 'attachment; filename="inflation_viz-%s.%s"' % (ds.version, fmt)
+    response.headers['X-Dataset-Version'] = ds.version
+    response.cache_control.no_cache = True
+    return response
+
+@app.route("/chart")
+def chart_render():
     
-    return out_html.to_html(embed_options={"actions":False})
+    start = time.perf_counter()
+
+    # Render the whole request from one dataset, even if a reload swaps it meanwhile.
+    ds = datasets.current
+
+    # Parse arguments into one spelling so equivalent queries share a cache entry.
+    args = canonical_args(request.args.to_dict())
+    key = (app.config['CHART_DATA_MODE'],) + cache_key(ds.version, args)
+    etag = chart_etag(key)
+
+    with timed() as timer:
+
+        # Let browsers and the proxy revalidate without rendering anything.
+        if request.if_none_match.contains_weak(etag):
+            cache = 'not_modified'
+            response = make_response('', 304)
+        else:
+            # An admin asking for a profile gets a fresh render, even of a cached chart.
+            forced = profiler.enabled and profiler.requested(request.args.get('profile'))
+            with stage('cache'):
+                body = None if forced else chart_cache.get(key)
+            cache = 'hit'
+            if body is None:
+                cache = 'miss'
+            if body is None and profiler.enabled and (forced or profiler.sample()):
+                # cProfile only sees this thread, so a profiled chart is rendered here rather than in render_pool.
+                cache = 'profiled'
+                with profiler.profile('chart', args=urlencode(args), version=ds.version, mode=app.config['CHART_DATA_MODE']) as capture, stage('render'):
+                    body = render_chart(ds, **args).encode('utf-8')
+                log.info('profiled chart %s', capture)
+                chart_cache.put(key, body)
+            elif body is None:
+                try:
+                    rendering = time.perf_counter()
+                    version, body, stages = render_pool.run(key, ds.version, app.config['CHART_DATA_MODE'], args, timeout=app.config['RENDER_TIMEOUT'])
+                except PoolBusy:
+                    response = busy_response()
+                    record_chart(args, 'busy', response, timer, start)
+                    return response
+
+                # The render's own stages; the rest was spent queued or waiting on an identical render.
+                timer.merge(stages)
+                timer.add('wait', max(time.perf_counter() - rendering - sum(stages.values()), 0.0))
+
+                # A render worker that could not load this request's version drew the current one instead.
+                if version != ds.version:
+                    body = render_chart(ds, **args).encode('utf-8')
+                chart_cache.put(key, body)
+
+            encoding = negotiate(request.accept_encodings, len(body))
+            if encoding != 'identity':
+                with stage('compress'):
+                    body = compressed(key, body, encoding)
+            response = make_response(body)
+            if encoding != 'identity':
+                response.content_encoding = encoding
+
+    response.set_etag(etag, weak=True)
+    response.vary.add('Accept-Encoding')
+    response.last_modified = ds.modified
+    response.headers['X-Dataset-Version'] = ds.version
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+
+    response = response.make_conditional(request)
+    record_chart(args, cache, response, timer, start)
+    return response
+
+def record_chart(args, cache, response, timer, start):
+    '''
+    Adds a /chart response's timings to its Server-Timing header, the metrics and the log.
+    '''
+    elapsed = time.perf_counter() - start
+    response.headers['Server-Timing'] = ', '.join(filter(None, [timer.server_timing(), 'total;dur=%.1f' % (elapsed * 1e3)]))
+
+    chart_type, inflation = chart_labels(args)
+    chart_seconds.observe(elapsed, chart_type, inflation, cache)
+    cache_requests.inc('chart', cache)
+    for name, seconds in timer.stages.items():
+        stage_seconds.observe(seconds, name)
+    if response.status_code == 200:
+        response_bytes.observe(response.content_length or 0, 'chart', chart_type)
+
+    log.info('chart status=%d cache=%s bytes=%d encoding=%s ms=%.1f version=%s args=%s timing="%s"',
+             response.status_code, cache, response.content_length or 0, response.content_encoding or 'identity', elapsed * 1e3,
+             response.headers.get('X-Dataset-Version', '-'), urlencode(args), timer.server_timing())
+
+@app.route("/basket", methods=['GET', 'POST'])
+def basket_render():
+    '''
+    A personal inflation index from weights over CPI series, e.g.
+    /basket?weights=CUSR0000SAF11:15,CUSR0000SAH:40&start_year=2010&end_year=2021,
+    or the same as a JSON body {"weights": {"CUSR0000SAF11": 15, ...}, "start_year": ...}.
+    '''
+    ds = datasets.current
+    body = request.get_json(silent=True)
+    try:
+        if body is None:
+            body = {}
+        if not isinstance(body, dict):
+            raise ValueError('body must be a JSON object')
+        args = dict(request.args.to_dict(), **body)
+        weights = check_weights(body['weights']) if 'weights' in body else parse_weights(args.get('weights', ''))
+        start_year = int(args.get('start_year', dict(CHART_ARGS)['start_year']))
+        end_year = int(args.get('end_year', dict(CHART_ARGS)['end_year']))
+    except (AttributeError, TypeError, ValueError) as e:
+        response = make_response(json.dumps({'error': str(e)}), 400)
+        response.mimetype = 'application/json'
+        return response
+
+    frame, used, excluded = basket(ds, weights, start_year, end_year)
+    body = json.dumps({
+        'version': ds.version,
+        'start_year': start_year,
+        'end_year': end_year,
+        'weights': used,
+        'excluded': excluded,
+        'data': to_columnar(frame)[0],
+    }, separators=(',', ':')).encode('utf-8')
+
+    encoding = negotiate(request.accept_encodings, len(body))
+    response = make_response(compress(body, encoding) if encoding != 'identity' else body)
+    response.mimetype = 'application/json'
+    if encoding != 'identity':
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['X-Dataset-Version'] = ds.version
+    response.cache_control.no_cache = True
+    response.set_etag(chart_etag(('basket', ds.version, start_year, end_year, sorted(weights.items()))), weak=True)
+    return response.make_conditional(request)
+
+@app.route("/correlation")
+def correlation_render():
+    '''
+    How the series of a chart move together, e.g. /correlation?inflation=Total&earnings=By+Race&unemployment=By+Race
+    takes every /chart arg, plus measure (yoy_change or change), window (months per rolling
+    correlation), max_lag (months) and focus (a series ID or Category whose pairs get
+    rolling correlations when there are too many pairs to send them all).
+    '''
+    ds = datasets.current
+    args = canonical_args(request.args.to_dict())
+    focus = request.args.get('focus', '').replace('+', ' ').strip()
+    try:
+        measure = request.args.get('measure', 'yoy_change')
+        if measure not in ('yoy_change', 'change'):
+            raise ValueError('measure must be yoy_change or change')
+        window = int(request.args.get('window', app.config['CORR_WINDOW']))
+        max_lag = int(request.args.get('max_lag', app.config['CORR_MAX_LAG']))
+        if not 2 <= window <= 1200 or not 0 <= max_lag <= 120:
+            raise ValueError('window must be 2 to 1200 months and max_lag 0 to 120')
+        start_year, end_year = int(args['start_year']), int(args['end_year'])
+    except ValueError as e:
+        response = make_response(json.dumps({'error': str(e)}), 400)
+        response.mimetype = 'application/json'
+        return response
+
+    # The results for a chart are kept per dataset version; the response also depends on focus.
+    key = ('correlation',) + cache_key(ds.version, args) + (measure, window, max_lag)
+    body = chart_cache.get(key + (focus,))
+    cache_requests.inc('correlation', 'miss' if body is None else 'hit')
+    if body is None:
+        result = chart_cache.get(key)
+        if result is None:
+            df = data_parse(ds, **args) if start_year <= end_year else pd.DataFrame(columns=['code', 'month', measure, 'Category', 'series'])
+            result = Correlations(df, measure, window, max_lag)
+            chart_cache.put(key, result)
+
+        # Rolling correlations of every pair, or of the focus series' pairs.
+        i, j = np.triu_indices(len(result.series), 1)
+        if focus:
+            hit = np.flatnonzero((result.series['series'] == focus).values | (result.series['Category'] == focus).values)
+            pick = np.isin(i, hit) | np.isin(j, hit)
+            i, j = i[pick], j[pick]
+        elif len(i) > app.config['CORR_ROLLING_PAIRS']:
+            i, j = i[:0], j[:0]
+
+        body = json.dumps(dict(result.payload(i, j), version=ds.version, args=args), separators=(',', ':')).encode('utf-8')
+        chart_cache.put(key + (focus,), body)
+
+    encoding = negotiate(request.accept_encodings, len(body))
+    if encoding != 'identity':
+        body = compressed(key + (focus,), body, encoding)
+    response_bytes.observe(len(body), 'correlation', chart_labels(args)[0])
+
+    response = make_response(body)
+    response.mimetype = 'application/json'
+    if encoding != 'identity':
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['X-Dataset-Version'] = ds.version
+    response.set_etag(chart_etag(key + (focus,)), weak=True)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route("/metrics")
+def metrics_page():
+
+    response = make_response(registry.render())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    response.cache_control.no_store = True
+    return response
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s %(message)s')
     app.run()
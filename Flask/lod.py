@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+from dataset import month_index
+
+# Calendar resolutions, finest first: months between points, and which month of the year is kept.
+RESOLUTIONS = [('monthly', 1), ('quarterly', 3), ('annual', 12)]
+
+def lttb(x, y, n):
+    '''
+    Returns the positions of n points of the line (x, y) picked by Largest-Triangle-
+    Three-Buckets: the first and last points, then from each of n - 2 equal buckets
+    the point making the largest triangle with the point kept before it and the
+    average of the next bucket. Peaks and turns survive; flat stretches thin out.
+
+    x and y may also be 2-D, one line of equal length per row, to thin them all in
+    one pass; the result then has a row of positions per line.
+    '''
+    x = np.asarray(x, dtype=np.float64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    size = x.shape[-1]
+    if n >= size or n < 3:
+        return np.broadcast_to(np.arange(size), x.shape).copy()
+
+    x2, y2 = np.atleast_2d(x), np.atleast_2d(y)
+    lines = np.arange(len(x2))
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+
+    # Averages of each bucket's next bucket, from running sums; the last bucket looks at the last point.
+    sum_x = np.concatenate([np.zeros((len(x2), 1)), np.cumsum(x2, axis=1)], axis=1)
+    sum_y = np.concatenate([np.zeros((len(y2), 1)), np.cumsum(y2, axis=1)], axis=1)
+    lo, hi = edges[1:-1], edges[2:]
+    next_x = np.concatenate([(sum_x[:, hi] - sum_x[:, lo]) / (hi - lo), x2[:, -1:]], axis=1)
+    next_y = np.concatenate([(sum_y[:, hi] - sum_y[:, lo]) / (hi - lo), y2[:, -1:]], axis=1)
+
+    keep = np.empty((len(x2), n), dtype=np.int64)
+    keep[:, 0], keep[:, -1] = 0, size - 1
+    ax, ay = x2[:, 0], y2[:, 0]
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        dx, dy = ax - next_x[:, i], ay - next_y[:, i]
+        area = np.abs(dx[:, None] * (y2[:, lo:hi] - ay[:, None]) - dy[:, None] * (x2[:, lo:hi] - ax[:, None]))
+        a = lo + area.argmax(axis=1)
+        keep[:, i + 1] = a
+        ax, ay = x2[lines, a], y2[lines, a]
+
+    return keep if x.ndim == 2 else keep[0]
+
+def anchors(y):
+    '''
+    Positions in one series whose exact values must stay on the chart: its first and
+    last points (the last is the end date the bar chart reports) and its extremes.
+    '''
+    if len(y) == 0:
+        return np.array([], dtype=np.int64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    return np.array([0, len(y) - 1, np.argmin(y), np.argmax(y)], dtype=np.int64)
+
+def resolution(points, series, budget, method='lttb'):
+    '''
+    Picks how to draw `series` lines of up to `points` points each within about
+    `budget` points: 'monthly' (everything) if that fits, else the finest calendar
+    resolution that fits, or with method 'lttb' a shape-preserving subset per series.
+    Returns the resolution's name and the points to keep per series.
+    '''
+    per_series = max(budget // max(series, 1), 3)
+    if points <= per_series:
+        return 'monthly', points
+    if method == 'lttb':
+        return 'lttb', per_series
+    for name, step in RESOLUTIONS:
+        if points / step <= per_series:
+            return name, per_series
+    return RESOLUTIONS[-1][0], per_series
+
+def downsample(df, budget, method='lttb'):
+    '''
+    Returns the rows of a line chart's data (date, Category, ...) to draw within about
+    `budget` points, and the resolution used. Rows are selected, never averaged, so
+    every point drawn or shown in a tooltip holds its exact value.
+    '''
+    if len(df) == 0:
+        return df, 'monthly'
+
+    codes, uniques = pd.factorize(df['Category'].values)
+    counts = np.bincount(codes)
+    name, per_series = resolution(counts.max(), len(uniques), budget, method)
+    if name == 'monthly':
+        return df, name
+
+    # Rows come sorted by series and date, so each series is one run of positions.
+    # Series of the same length are thinned together, one per row of a matrix.
+    order = np.argsort(codes, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    months = month_index(df['date'].values)
+    change = df['change'].values
+
+    keep = []
+    for length in np.unique(counts):
+        rows = order[starts[counts == length][:, None] + np.arange(length)]
+        if name == 'lttb':
+            picked = lttb(months[rows], change[rows], per_series)
+        else:
+            step = dict(RESOLUTIONS)[name]
+            picked = [np.flatnonzero(m % step == step - 1) for m in months[rows]]
+        for series_rows, series_picked in zip(rows, picked):
+            keep.append(series_rows[np.union1d(series_picked, anchors(change[series_rows]))])
+
+    return df.iloc[np.sort(np.concatenate(keep))], name
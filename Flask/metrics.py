@@ -0,0 +1,183 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram buckets: seconds for latencies, bytes for response sizes.
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6)
+
+_local = threading.local()
+
+class StageTimer(object):
+    '''
+    How long each named stage of one request took, in the order they first ran.
+    A stage that runs more than once adds up.
+    '''
+
+    def __init__(self):
+        self.stages = {}
+        self._open = []
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def merge(self, stages):
+        for name, seconds in stages.items():
+            self.add(name, seconds)
+
+    def total(self):
+        return sum(self.stages.values())
+
+    def server_timing(self):
+        '''
+        The stages as a Server-Timing header value, durations in milliseconds.
+        '''
+        return ', '.join('%s;dur=%.1f' % (name, seconds * 1e3) for name, seconds in self.stages.items())
+
+@contextmanager
+def timed():
+    '''
+    Makes a new StageTimer the one stage() records into on this thread, until the block ends.
+    '''
+    timer = StageTimer()
+    previous = getattr(_local, 'timer', None)
+    _local.timer = timer
+    try:
+        yield timer
+    finally:
+        _local.timer = previous
+
+@contextmanager
+def stage(name):
+    '''
+    Times the block as stage `name` of the request being timed on this thread, if any.
+    Stages may nest; time spent in an inner stage is only counted there, so the
+    stages of a request add up to the time they covered.
+    '''
+    timer = getattr(_local, 'timer', None)
+    if timer is None:
+        yield
+        return
+    timer._open.append(0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        timer.add(name, elapsed - timer._open.pop())
+        if timer._open:
+            timer._open[-1] += elapsed
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join('%s="%s"' % (k, escape(v)) for k, v in pairs) + '}'
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Counter(object):
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s counter' % self.name]
+        with self._lock:
+            values = sorted(self.values.items())
+        for labels, value in values:
+            lines.append('%s%s %s' % (self.name, _labels(self.labels, labels), _number(value)))
+        return lines
+
+class Histogram(object):
+
+    def __init__(self, name, help, labels=(), buckets=SECONDS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                # One count per bucket (not cumulative until rendered), then the sum.
+                counts = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s histogram' % self.name]
+        with self._lock:
+            values = sorted((labels, list(counts)) for labels, counts in self.values.items())
+        for labels, counts in values:
+            total = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                total += count
+                le = bound if bound == '+Inf' else _number(bound)
+                lines.append('%s_bucket%s %d' % (self.name, _labels(self.labels, labels, [('le', le)]), total))
+            lines.append('%s_sum%s %s' % (self.name, _labels(self.labels, labels), repr(counts[-1])))
+            lines.append('%s_count%s %d' % (self.name, _labels(self.labels, labels), total))
+        return lines
+
+class Sampled(object):
+    '''
+    A gauge or counter whose value is read from fn() when scraped, for numbers kept elsewhere.
+    fn may return one number, or a dict of label value tuples to numbers.
+    '''
+
+    def __init__(self, name, help, fn, labels=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labels = tuple(labels)
+        self.kind = kind
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s %s' % (self.name, self.kind)]
+        value = self.fn()
+        values = value if isinstance(value, dict) else {(): value}
+        for labels, v in sorted(values.items()):
+            lines.append('%s%s %s' % (self.name, _labels(self.labels, labels), _number(v)))
+        return lines
+
+class Registry(object):
+    '''
+    The metrics of one process, rendered in the Prometheus text format. Under a
+    server with several worker processes each keeps its own; a scrape sees one.
+    '''
+
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=SECONDS):
+        return self.add(Histogram(name, help, labels, buckets))
+
+    def sampled(self, name, help, fn, labels=(), kind='gauge'):
+        return self.add(Sampled(name, help, fn, labels, kind))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,98 @@
+import cProfile
+import glob
+import hmac
+import io
+import itertools
+import os
+import pstats
+import random
+import time
+from contextlib import contextmanager
+
+class Profiler(object):
+    '''
+    Profiles chosen requests with cProfile and writes each profile to directory,
+    keeping only the newest `keep` of them.
+
+    A request is profiled when it carries the admin token, or at random for a
+    `rate` fraction of the requests offered by sample(). Without a directory, or
+    with neither a token nor a rate, the profiler is off and costs one check.
+
+    Each capture is two files: <name>.prof for pstats or snakeviz
+    (python -m pstats <name>.prof), and <name>.txt with what was profiled and the
+    heaviest functions by cumulative time.
+    '''
+
+    def __init__(self, directory=None, rate=0.0, token=None, keep=50):
+        self.directory = directory
+        self.rate = rate
+        self.token = token
+        self.keep = keep
+        self.enabled = bool(directory) and (rate > 0 or bool(token))
+        self.captured = 0
+        self._seq = itertools.count()
+
+    def requested(self, token):
+        '''
+        True if token is the admin token asking for this request to be profiled. Compared
+        as bytes: compare_digest rejects str with non-ASCII characters.
+        '''
+        return self.enabled and bool(self.token) and token is not None and hmac.compare_digest(token.encode('utf-8'), self.token.encode('utf-8'))
+
+    def sample(self):
+        return self.enabled and self.rate > 0 and random.random() < self.rate
+
+    @contextmanager
+    def profile(self, label, **info):
+        '''
+        Profiles the block, then saves it with label and info (e.g. the request args).
+        Yields the capture's name.
+        '''
+        name = '%s-%s-%d-%d' % (label, time.strftime('%Y%m%d-%H%M%S'), os.getpid(), next(self._seq))
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield name
+        finally:
+            profile.disable()
+            self.save(profile, name, dict(info, wall_ms='%.1f' % ((time.perf_counter() - start) * 1e3)))
+
+    def save(self, profile, name, info):
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+
+        summary = io.StringIO()
+        for key, value in info.items():
+            summary.write('%s: %s\n' % (key, value))
+        summary.write('\n')
+        pstats.Stats(profile, stream=summary).sort_stats('cumulative').print_stats(40)
+
+        # Write under temporary names so a reader never sees half a file.
+        profile.dump_stats(path + '.prof.tmp')
+        with open(path + '.txt.tmp', 'w') as f:
+            f.write(summary.getvalue())
+        os.replace(path + '.prof.tmp', path + '.prof')
+        os.replace(path + '.txt.tmp', path + '.txt')
+        self.captured += 1
+
+        self.prune()
+
+    def prune(self):
+        '''
+        Removes all but the newest `keep` captures. Several processes may prune the same directory.
+        '''
+        def mtime(path):
+            try:
+                return os.path.getmtime(path)
+            except FileNotFoundError:
+                return 0
+
+        captures = sorted(glob.glob(os.path.join(self.directory, '*.prof')), key=mtime)
+        for old in captures[:-self.keep] if self.keep else captures:
+            for path in (old, old[:-len('.prof')] + '.txt'):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,126 @@
+import logging
+import os
+import threading
+import time
+
+from dataset import MANIFEST
+
+log = logging.getLogger('inflation_viz.reloader')
+
+def file_stamp(path):
+    '''
+    Identifies the current contents of a pickle, or of a bundle directory by its
+    manifest (which Dataset.save() replaces last).
+    '''
+    if os.path.isdir(path):
+        path = os.path.join(path, MANIFEST)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+class DatasetReloader(object):
+    '''
+    Holds the Dataset the app serves and swaps in a new one when the file at path changes.
+
+    Requests read .current once and use that object throughout, so a request that
+    started on the old version finishes on it. New versions are loaded off the
+    request path (by a polling thread, or by calling check()), and only replace
+    .current once fully loaded. The last `keep` versions stay reachable through
+    get(version) so pages drawn from the old version can still fetch their data.
+    '''
+
+    def __init__(self, path, load, interval=30, keep=2):
+        self.path = path
+        self.load = load
+        self.interval = interval
+        self.keep = keep
+        self.reloads = 0
+        self.errors = 0
+        self.last_error = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._thread_pid = None
+
+        self._stamp = file_stamp(path)
+        self.current = load(path)
+        self.versions = {self.current.version: self.current}
+
+    def get(self, version=None):
+        '''
+        Returns the dataset with the given version if it is still held, else the current one.
+        '''
+        return self.versions.get(version, self.current)
+
+    def on_swap(self, fn):
+        '''
+        Registers fn(reloader) to run after each swap, e.g. to drop caches for retired versions.
+        '''
+        self._listeners.append(fn)
+        return fn
+
+    def check(self):
+        '''
+        Loads and swaps in the dataset if the file changed. Returns True if it swapped.
+        '''
+        stamp = file_stamp(self.path)
+        if stamp is None or stamp == self._stamp:
+            return False
+
+        with self._lock:
+            if stamp == self._stamp:
+                return False
+            try:
+                ds = self.load(self.path)
+            except Exception as e:
+                # Most likely a file still being written; keep serving and try again next time.
+                self.errors += 1
+                self.last_error = e
+                log.warning('Dataset reload failed, still serving %s: %s', self.current.version, e)
+                return False
+
+            # Ignore a load that raced with another write; the next check picks up the final file.
+            if file_stamp(self.path) != stamp:
+                return False
+            self._stamp = stamp
+            if ds.version == self.current.version:
+                return False
+
+            # Publish the new version before making it current, so anything that sees
+            # it as current can also look it up. Both are single reference assignments.
+            versions = dict(self.versions)
+            versions.pop(ds.version, None)
+            versions[ds.version] = ds
+            for old in list(versions)[:-self.keep]:
+                del versions[old]
+            self.versions = versions
+            self.current = ds
+            self.reloads += 1
+
+        log.info('Dataset reloaded: now serving %s', ds.version)
+        for fn in self._listeners:
+            fn(self)
+
+        return True
+
+    def start(self):
+        '''
+        Starts the polling thread for this process, if it is not running already.
+        Safe to call on every request; under a pre-forking server each worker starts its own.
+        '''
+        if not self.interval or self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._poll, name='dataset-reloader', daemon=True).start()
+
+    def _poll(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception:
+                log.exception('Dataset reload check failed')
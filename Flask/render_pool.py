@@ -0,0 +1,113 @@
+import importlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+class PoolBusy(Exception):
+    pass
+
+def _import(name):
+    importlib.import_module(name)
+
+class RenderPool(object):
+    '''
+    Runs fn(*args) for request threads, at most once at a time per key.
+
+    Callers asking for a key that is already being rendered wait for that result
+    instead of starting their own (single-flight). At most max_pending distinct keys
+    may be queued or running; beyond that run() raises PoolBusy straight away so the
+    caller can answer "busy" rather than pile up.
+
+    With workers > 0, renders happen in that many worker processes, so the CPU work
+    of building charts does not hold the GIL the serving threads need. fn must then
+    be a module-level function; each worker imports its module once at start. With
+    workers = 0 the first caller renders in its own thread.
+    '''
+
+    def __init__(self, fn, workers=0, max_pending=8):
+        self.fn = fn
+        self.workers = workers
+        self.max_pending = max_pending
+        self.submitted = 0
+        self.joined = 0
+        self.rejected = 0
+        self._inflight = {}
+        self._lock = threading.RLock()
+        self._executor = None
+        self._executor_pid = None
+
+    def executor(self):
+
+        # One pool per serving process; a forked server worker must not reuse its parent's.
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_import, initargs=(self.fn.__module__,))
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def start(self):
+        '''
+        Starts the worker processes now rather than on the first render. Safe to call on every request.
+        '''
+        if self.workers and self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor_pid != os.getpid():
+                    executor = self.executor()
+                    for _ in range(self.workers):
+                        executor.submit(os.getpid)
+
+    def pending(self):
+        return len(self._inflight)
+
+    def run(self, key, *args, timeout=None):
+        '''
+        Returns fn(*args), shared with any identical call for key already in flight.
+        Raises PoolBusy if too many distinct renders are queued, or if the result
+        takes longer than timeout seconds.
+        '''
+        owner = False
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.joined += 1
+            elif len(self._inflight) >= self.max_pending:
+                self.rejected += 1
+                raise PoolBusy('%d renders already queued' % len(self._inflight))
+            else:
+                if self.workers:
+                    try:
+                        future = self.executor().submit(self.fn, *args)
+                    except BrokenProcessPool:
+                        # A worker died (e.g. killed for memory); start a fresh pool.
+                        self._executor = None
+                        future = self.executor().submit(self.fn, *args)
+                else:
+                    future = Future()
+                    owner = True
+                self.submitted += 1
+                self._inflight[key] = future
+                future.add_done_callback(lambda f: self._done(key, f))
+
+        if owner:
+            try:
+                future.set_result(self.fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            raise PoolBusy('render took longer than %ss' % timeout)
+
+    def _done(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def shutdown(self):
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
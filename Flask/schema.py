@@ -0,0 +1,89 @@
+'''
+Compact schema for combined_data.pkl, shared by Final_Data_Pull.ipynb (which
+writes the file) and the Flask app (which reads it).
+'''
+import numpy as np
+import pandas as pd
+
+# Column name -> dtype. Repeated labels are dictionary-encoded as categoricals,
+# dates are stored as integer months since January of year 0 and values as float32.
+SCHEMA = {
+    'series': 'category',
+    'Category': 'category',
+    'Parent Series ID': 'category',
+    'Level': 'float32',
+    'Leaf': 'float32',
+    'Type': 'category',
+    'Bucket': 'category',
+    'year': 'int16',
+    'period': 'category',
+    'periodName': 'category',
+    'latest': 'category',
+    'footnotes': 'category',
+    'month': 'int32',
+    'value': 'float32',
+}
+
+def footnote_text(notes):
+    '''
+    Flattens the BLS API footnotes (a list of dicts) into a single string.
+    '''
+    if isinstance(notes, (list, tuple)):
+        return '; '.join(str(n['text']) for n in notes if isinstance(n, dict) and n.get('text'))
+    if pd.isna(notes):
+        return ''
+    return str(notes)
+
+def compact(df):
+    '''
+    Returns a copy of the combined frame converted to SCHEMA. Safe to call on a frame
+    that is already compact.
+    '''
+    df = df.copy()
+
+    if 'date' in df.columns:
+        dates = pd.to_datetime(df['date']).values.astype('datetime64[M]')
+        df['month'] = dates.astype(np.int64) + 1970 * 12
+        df = df.drop(columns='date')
+    if 'footnotes' in df.columns:
+        df['footnotes'] = df['footnotes'].map(footnote_text)
+
+    # Fill in columns that only some sources provide (e.g. stocks have no series ID).
+    for col, dtype in SCHEMA.items():
+        if col not in df.columns:
+            df[col] = np.nan
+        df[col] = df[col].astype(dtype)
+
+    return df[list(SCHEMA)].reset_index(drop=True)
+
+def validate(df):
+    '''
+    Raises ValueError if df does not match SCHEMA or breaks its invariants. Returns df.
+    '''
+    problems = []
+
+    missing = [c for c in SCHEMA if c not in df.columns]
+    extra = [c for c in df.columns if c not in SCHEMA]
+    if missing:
+        problems.append('missing columns: %s' % missing)
+    if extra:
+        problems.append('unexpected columns: %s' % extra)
+
+    for col, dtype in SCHEMA.items():
+        if col in df.columns and str(df[col].dtype) != dtype:
+            problems.append('%s is %s, expected %s' % (col, df[col].dtype, dtype))
+
+    if not problems:
+        if df['Category'].isna().any():
+            problems.append('rows without a Category')
+        if not np.isfinite(df['value'].values).all():
+            problems.append('non-finite values')
+        if (df['month'] // 12 != df['year']).any():
+            problems.append('month index does not match year')
+        if df.duplicated(['Category', 'month']).any():
+            problems.append('duplicate (Category, month) observations')
+
+    if problems:
+        raise ValueError('combined data does not match schema: ' + '; '.join(problems))
+
+    return df
@@ -0,0 +1,118 @@
+import json
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+SLOT = re.compile(r'"@@(\w+)@@"')
+
+def slot(name):
+    '''
+    A placeholder for a value filled in per chart. Use it wherever the chart
+    takes a string; fill() replaces it, quotes included, with JSON text.
+    '''
+    return '@@%s@@' % name
+
+def json_column(values):
+    '''
+    Returns the JSON text of each value in an array, written as Altair writes
+    inline data: dates as local-time ISO strings, and NaN, infinity and None as null.
+    '''
+    kind = values.dtype.kind
+    if kind == 'f':
+        text = np.array(list(map(repr, values.tolist())), dtype=object)
+        text[~np.isfinite(values)] = 'null'
+        return text
+    if kind in 'iu':
+        return np.array(list(map(str, values.tolist())), dtype=object)
+    if kind == 'b':
+        return np.where(values, 'true', 'false').astype(object)
+
+    # Dates and text repeat down the column (one per category, or one per date), so
+    # encode each distinct value once. Missing values get code -1, the last entry.
+    codes, uniques = pd.factorize(values)
+    if kind == 'M':
+        text = ['"%s"' % s for s in np.datetime_as_string(uniques, unit='s')] + ['""']
+    else:
+        text = [json.dumps(u, default=str) for u in uniques] + ['null']
+    return np.array(text, dtype=object)[codes]
+
+def records_json(df):
+    '''
+    Returns df as a JSON array of row objects, the way Altair embeds inline data,
+    without building a dict per row.
+    '''
+    if len(df) == 0:
+        return '[]'
+
+    row = '{' + ','.join(json.dumps(str(col)).replace('%', '%%') + ':%s' for col in df.columns) + '}'
+    columns = [json_column(df[col].values) for col in df.columns]
+    return '[' + ','.join(map(row.__mod__, zip(*columns))) + ']'
+
+class SpecTemplate(object):
+    '''
+    The HTML page for one chart, built and validated by Altair once with slot()
+    placeholders where its data and per-chart strings go.
+
+    datasets names the alt.NamedData sources the chart reads; they are embedded
+    under those names from the slots of the same name. fill(**slots) then only
+    joins strings: each value must already be JSON text (records_json for data,
+    json.dumps for strings).
+    '''
+
+    def __init__(self, chart, datasets=(), embed_options=None):
+        import altair as alt
+
+        spec = chart.to_dict()
+        if datasets:
+            spec.setdefault('datasets', {}).update((name, slot(name)) for name in datasets)
+        html = alt.utils.spec_to_html(
+            spec, mode='vega-lite', vegalite_version=alt.VEGALITE_VERSION,
+            vegaembed_version=alt.VEGAEMBED_VERSION, vega_version=alt.VEGA_VERSION,
+            embed_options=embed_options)
+
+        # Odd entries are slot names, even entries the text between them.
+        self.parts = SLOT.split(html)
+        self.slots = set(self.parts[1::2])
+
+    def fill(self, **slots):
+        parts = list(self.parts)
+        parts[1::2] = [slots[name] for name in parts[1::2]]
+        return ''.join(parts)
+
+class SpecCompiler(object):
+    '''
+    Holds one SpecTemplate per chart shape, compiled on first use in each process.
+    '''
+
+    def __init__(self, embed_options=None):
+        self.embed_options = embed_options
+        self.compiled = 0
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def template(self, key, build, datasets=()):
+        '''
+        Returns the template for key, calling build() for its Altair chart if there is none yet.
+        key must cover everything that changes the spec other than the slots.
+        '''
+        template = self._templates.get(key)
+        if template is None:
+            with self._lock:
+                template = self._templates.get(key)
+                if template is None:
+                    template = SpecTemplate(build(), datasets, self.embed_options)
+                    self._templates[key] = template
+                    self.compiled += 1
+        return template
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+def frame_shape(df):
+    '''
+    The column names and dtypes of df, which decide the transforms of a 'url' mode chart.
+    '''
+    return tuple((col, str(dtype)) for col, dtype in df.dtypes.items())
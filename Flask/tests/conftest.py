@@ -0,0 +1,40 @@
+'''
+Serves flaskapp from a small synthetic dataset (benchmarks/synthetic.py) written
+to a temporary bundle, so the tests need no real data.
+'''
+import os
+import shutil
+import sys
+import tempfile
+import warnings
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, os.path.join(HERE, '..', 'benchmarks'))
+warnings.filterwarnings('ignore')
+
+from dataset import Dataset
+from synthetic import synthetic
+
+# flaskapp reads its settings at import, so the bundle has to exist first.
+WORK = tempfile.mkdtemp(prefix='inflation_viz_tests_')
+Dataset(synthetic(start_year=1990), version='tests').save(os.path.join(WORK, 'bundle'))
+os.environ.update(INFLATION_VIZ_DATA=os.path.join(WORK, 'bundle'), INFLATION_VIZ_RELOAD='0',
+                  INFLATION_VIZ_RENDER_WORKERS='0', INFLATION_VIZ_CACHE=os.path.join(WORK, 'cache'))
+
+@pytest.fixture(scope='session', autouse=True)
+def cleanup():
+    yield
+    shutil.rmtree(WORK, ignore_errors=True)
+
+@pytest.fixture
+def flaskapp():
+    import flaskapp
+    flaskapp.chart_cache.clear()
+    return flaskapp
+
+@pytest.fixture
+def client(flaskapp):
+    return flaskapp.app.test_client()
@@ -0,0 +1,19 @@
+import pandas as pd
+import pytest
+
+from dataset import Dataset
+from synthetic import synthetic
+
+def test_from_pickle_rejects_schema_drift(tmp_path):
+    df = synthetic(start_year=2010)
+    df['extra'] = 1
+    df.to_pickle(tmp_path / 'drift.pkl')
+    with pytest.raises(ValueError, match='unexpected columns'):
+        Dataset.from_pickle(str(tmp_path / 'drift.pkl'))
+
+def test_from_pickle_converts_dated_pickles(tmp_path):
+    df = synthetic(start_year=2010)
+    df['date'] = pd.to_datetime({'year': df['month'] // 12, 'month': df['month'] % 12 + 1, 'day': 1})
+    df.drop(columns='month').to_pickle(tmp_path / 'dated.pkl')
+    ds = Dataset.from_pickle(str(tmp_path / 'dated.pkl'))
+    assert len(ds.values) == len(df)
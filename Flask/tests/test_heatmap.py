@@ -0,0 +1,27 @@
+from synthetic import series_id
+
+HEATMAP = '/chart?chart_type=Heatmap&start_year=2000&end_year=2020'
+
+def test_heatmap_draws_every_pair(client):
+    # The 8 groups under the root.
+    response = client.get(HEATMAP)
+    assert response.status_code == 200
+    assert b'Correlation of Annual Change' in response.data
+
+def test_heatmap_refuses_too_many_series(flaskapp, client, monkeypatch):
+    monkeypatch.setitem(flaskapp.app.config, 'HEATMAP_MAX_SERIES', 5)
+    response = client.get(HEATMAP)
+    assert b'at most 5 categories; this chart has 8' in response.data
+    assert b'Correlation of Annual Change' not in response.data
+
+def test_heatmap_limit_covers_leaves(flaskapp, client):
+    # All 128 leaves are over the default limit; the 4 children of a category are not.
+    wide = client.get(HEATMAP + '&expand=Leaves&parent=' + series_id(0))
+    assert b'Error: A heatmap can compare at most %d' % flaskapp.app.config['HEATMAP_MAX_SERIES'] in wide.data
+    narrow = client.get(HEATMAP + '&parent=' + series_id(1))
+    assert b'Correlation of Annual Change' in narrow.data
+
+def test_heatmap_data_is_empty_over_the_limit(flaskapp, client):
+    response = client.get('/data?chart_type=Heatmap&start_year=2000&end_year=2020&expand=Leaves&parent=' + series_id(0))
+    assert response.status_code == 200
+    assert response.get_json() == [{}]
@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from profiling import Profiler
+
+CHART = '/chart?chart_type=Bar+Chart&start_year=2010&end_year=2020'
+
+@pytest.fixture
+def profiler(flaskapp, monkeypatch, tmp_path):
+    profiler = Profiler(str(tmp_path), 0, 's3cret', 5)
+    monkeypatch.setattr(flaskapp, 'profiler', profiler)
+    return profiler
+
+def test_requested_compares_any_token(tmp_path):
+    profiler = Profiler(str(tmp_path), 0, 'clé', 5)
+    assert profiler.requested('clé')
+    assert not profiler.requested('é')
+    assert not profiler.requested('cle')
+    assert not profiler.requested(None)
+
+@pytest.mark.parametrize('token', ['%C3%A9', 'wrong', ''])
+def test_other_tokens_are_not_profiled(client, profiler, token):
+    response = client.get(CHART + '&profile=' + token)
+    assert response.status_code == 200
+    assert profiler.captured == 0
+    assert os.listdir(profiler.directory) == []
+
+def test_admin_token_is_profiled(client, profiler):
+    response = client.get(CHART + '&profile=s3cret')
+    assert response.status_code == 200
+    assert profiler.captured == 1
+    assert os.listdir(profiler.directory)
@@ -0,0 +1,20 @@
+from dataset import Dataset
+from synthetic import synthetic
+
+NO_DATA = b'Error: No data to display'
+
+def test_year_lists_stop_at_the_last_december(flaskapp, client):
+    # The synthetic data ends in June 2022.
+    page = client.get('/').data
+    assert b'<option value = "2021"' in page
+    assert b'<option value = "2022"' not in page
+
+def test_last_full_year_counts_a_year_ending_in_december(flaskapp):
+    assert flaskapp.last_full_year(Dataset(synthetic(start_year=2010, end_year=2020))) == 2019
+    assert flaskapp.last_full_year(Dataset(synthetic(start_year=2010, end_year=2021).query('month < 2021 * 12'))) == 2020
+
+def test_bar_chart_without_a_december_says_so(client):
+    response = client.get('/chart?chart_type=Bar+Chart&start_year=2010&end_year=2022')
+    assert response.status_code == 200
+    assert NO_DATA in response.data
+    assert NO_DATA not in client.get('/chart?chart_type=Bar+Chart&start_year=2010&end_year=2021').data